@@ -0,0 +1,119 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from typing import FrozenSet, Set
+
+from aiogram import Bot, Router
+from aiogram.types import BufferedInputFile, Message
+from aiogram.filters import Command, CommandObject
+
+from ..engine.session import SessionStore
+from ..outbox import Outbox
+
+log = logging.getLogger(__name__)
+
+# admin ids come from the dispatcher (dp["admin_ids"], ADMIN_IDS, see main.py);
+# for anyone else the commands do nothing
+router = Router(name=__name__)
+
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 120
+TOP = 40
+
+# captures running now, at most one of each kind
+_running: Set[str] = set()
+# strong references, so a capture task isn't collected while it sleeps
+_tasks: Set[asyncio.Task] = set()
+
+def _seconds(command: CommandObject) -> int:
+    arg = (command.args or "").strip()
+    return min(int(arg), MAX_SECONDS) if arg.isdigit() and int(arg) > 0 else DEFAULT_SECONDS
+
+def _start(kind: str, coro) -> None:
+    _running.add(kind)
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    task.add_done_callback(lambda _: _running.discard(kind))
+
+async def _reply_file(bot: Bot, chat_id: int, name: str, text: str, caption: str) -> None:
+    # straight to the API, not through the outbox: a file, and rare
+    try:
+        await bot.send_document(chat_id, BufferedInputFile(text.encode(), filename=name), caption=caption)
+    except Exception:
+        log.exception("Failed to send %s", name)
+
+async def _profile(bot: Bot, chat_id: int, seconds: int) -> None:
+    # cProfile sees everything on the event loop thread: every handler,
+    # middleware and the outbox, for as long as it is enabled
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    for key in ("tottime", "cumulative"):
+        out.write(f"===== top {TOP} by {key} =====\n")
+        stats.sort_stats(key).print_stats(TOP)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    await _reply_file(bot, chat_id, f"profile-{stamp}.txt", out.getvalue(), f"cProfile, {seconds} с")
+
+async def _memtrace(bot: Bot, chat_id: int, seconds: int, store: SessionStore) -> None:
+    # tracemalloc only sees what is allocated after start(), so the diff is
+    # what the bot allocated (and still holds) during the window
+    tracemalloc.start(10)
+    try:
+        sessions_before = len(store)
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        sessions_after = len(store)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),
+              tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+    before, after = before.filter_traces(ignore), after.filter_traces(ignore)
+    engine = (tracemalloc.Filter(True, "*/engine/*"),)
+    out = io.StringIO()
+    out.write(f"sessions: {sessions_before} -> {sessions_after}\n"
+              f"traced: {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB\n\n")
+    out.write(f"===== top {TOP} lines, all code =====\n")
+    for diff in after.compare_to(before, "lineno")[:TOP]:
+        out.write(f"{diff}\n")
+    out.write(f"\n===== top {TOP} lines, engine (sessions, skills, stores) =====\n")
+    for diff in after.filter_traces(engine).compare_to(before.filter_traces(engine), "lineno")[:TOP]:
+        out.write(f"{diff}\n")
+    out.write("\n===== biggest growth, with call stacks =====\n")
+    for diff in after.compare_to(before, "traceback")[:5]:
+        out.write(f"{diff.size_diff / 1024:+.1f} KiB in {diff.count_diff:+d} blocks\n")
+        out.writelines(f"    {line}\n" for line in diff.traceback.format())
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    await _reply_file(bot, chat_id, f"memtrace-{stamp}.txt", out.getvalue(), f"tracemalloc, {seconds} с")
+
+@router.message(Command("profile"))
+async def on_profile(m: Message, command: CommandObject, bot: Bot, outbox: Outbox, admin_ids: FrozenSet[int]):
+    if m.from_user.id not in admin_ids:
+        return
+    if "profile" in _running:
+        return outbox.send(m.chat.id, "Профилирование уже идёт.")
+    seconds = _seconds(command)
+    _start("profile", _profile(bot, m.chat.id, seconds))
+    outbox.send(m.chat.id, f"cProfile включён на {seconds} с, пришлю файл.")
+
+@router.message(Command("memtrace"))
+async def on_memtrace(m: Message, command: CommandObject, bot: Bot, outbox: Outbox, store: SessionStore,
+                      admin_ids: FrozenSet[int]):
+    if m.from_user.id not in admin_ids:
+        return
+    if "memtrace" in _running:
+        return outbox.send(m.chat.id, "tracemalloc уже запущен.")
+    seconds = _seconds(command)
+    _start("memtrace", _memtrace(bot, m.chat.id, seconds, store))
+    outbox.send(m.chat.id, f"tracemalloc включён на {seconds} с, пришлю разницу снимков.")
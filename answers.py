@@ -0,0 +1,100 @@
+
+import re
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Optional, Tuple
+
+from .symbolic import normalize_expression
+from .utils import parse_number
+
+INT = "int"
+FRACTION = "fraction"
+DECIMAL = "decimal"
+LIST = "list"
+EXPR = "expr"
+
+# "x = 6", "x1 = 2", "D = 49", "а = -3": a letter, maybe an index, and "="
+_ASSIGN = re.compile(r"^([a-zа-яё][0-9₁₂]?)\s*=\s*(.+)$", re.I | re.S)
+# "2/3", "x/3", "1,5 / x"
+_RATIO = re.compile(r"^(\d+(?:[.,]\d+)?|[xх])\s*/\s*(\d+(?:[.,]\d+)?|[xх])$", re.I)
+
+# A student's message, read once. `value` is its exact value when the whole
+# message (after an optional "x = ") is one number; `items` is the message
+# split on ";" or, when there is none, on "," - both are kept because "1,5"
+# is 1.5 to a checker that wants a number and 1 and 5 to one that wants two.
+# `name` is set when the message was written as an assignment ("x = 6"),
+# `body` is what follows the "=" (the whole text otherwise). `ratio` holds the
+# two terms of "a/b" as written (x is None), so 4/6 is not 2/3 there; `expr` is
+# the message as an equation or expression for sympy (see
+# symbolic.normalize_expression), None if it can't be one.
+@dataclass(frozen=True, slots=True)
+class Answer:
+    text: str
+    kind: str
+    value: Optional[Fraction] = None
+    items: Tuple["Answer", ...] = ()
+    name: Optional[str] = None
+    body: str = ""
+    ratio: Optional[Tuple[Optional[Fraction], Optional[Fraction]]] = None
+    expr: Optional[str] = None
+
+    @property
+    def is_number(self) -> bool:
+        return self.value is not None
+
+    @property
+    def is_integer(self) -> bool:
+        return self.value is not None and self.value.denominator == 1
+
+    def numbers(self) -> Optional[Tuple[Fraction, ...]]:
+        # the list items as numbers, None unless every item is one
+        values = tuple(item.value for item in self.items)
+        return None if any(v is None for v in values) else values
+
+def _kind(body: str, value: Optional[Fraction]) -> str:
+    if value is None:
+        return EXPR
+    if "/" in body:
+        return FRACTION
+    if "." in body or "," in body:
+        return DECIMAL
+    return INT
+
+def _split(body: str) -> Tuple[str, ...]:
+    sep = ";" if ";" in body else ","
+    return tuple(part.strip() for part in body.split(sep) if part.strip())
+
+def _single(text: str) -> Answer:
+    # one list item: a number, possibly named, or anything else
+    m = _ASSIGN.match(text)
+    name, body = (_name(m.group(1)), m.group(2).strip()) if m and "=" not in m.group(2) else (None, text)
+    value = parse_number(body)
+    return Answer(text, _kind(body, value), value, name=name, body=body)
+
+def _name(name: str) -> str:
+    # Cyrillic "х" is x; other letters keep their case (D is not d)
+    return "x" + name[1:] if name[0] in "xXхХ" else name
+
+def _ratio(body: str) -> Optional[Tuple[Optional[Fraction], Optional[Fraction]]]:
+    m = _RATIO.match(body)
+    if not m:
+        return None
+    return tuple(None if t in "xXхХ" else parse_number(t) for t in m.groups())
+
+def parse_answer(text: str) -> Answer:
+    # Once per message, by the caller of Skill.next_step / anext_step; the
+    # checker of the step gets the result.
+    text = text.strip()
+    whole = _single(text)
+    parts = _split(whole.body)
+    ratio, expr = _ratio(whole.body), normalize_expression(text)
+    if len(parts) < 2:
+        return Answer(text, whole.kind, whole.value, (whole,) if parts else (), whole.name, whole.body,
+                      ratio, expr)
+    items = tuple(_single(part) for part in parts)
+    kind = whole.kind if whole.value is not None else LIST
+    return Answer(text, kind, whole.value, items, whole.name, whole.body, ratio, expr)
+
+def mentions_none(answer: Answer) -> bool:
+    # "нет", "корней нет", "нет корней"
+    return "нет" in answer.text.lower()
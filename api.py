@@ -0,0 +1,188 @@
+
+import asyncio
+import hmac
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from .coach import Coach, Reply, step_text
+from .engine.practice import DIFFICULTIES, find_topic
+from .metrics import HANDLER_LATENCY
+
+log = logging.getLogger(__name__)
+
+OPS = ("start", "answer", "hint", "giveup", "new")
+# requests in one POST /v1/batch
+MAX_BATCH = 100
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class _UserLock:
+    __slots__ = ("lock", "refs")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.refs = 0
+
+# JSON over HTTP for web and mobile clients, on the same Coach (and so the
+# same session store, events and metrics) as the Telegram handlers. A web
+# user N is kept under the store key -N, so it never meets a Telegram id.
+# Actions of one user run one after another, like ConcurrencyMiddleware does
+# for updates; POST /v1/batch runs the requests of different users at once,
+# each user's in the order given. Connections are kept alive by aiohttp.
+# With `token` set, requests need "Authorization: Bearer <token>".
+class ApiServer:
+    def __init__(self, coach: Coach, token: str = ""):
+        self.coach = coach
+        self.token = token
+        self._locks: Dict[int, _UserLock] = {}
+
+    def _key(self, body: Dict[str, Any]) -> int:
+        user = body.get("user")
+        if not isinstance(user, int) or isinstance(user, bool) or user <= 0:
+            raise ApiError(400, "user must be a positive integer")
+        return -user
+
+    def _session(self, key: int, reply: Optional[Reply] = None) -> Optional[Dict[str, Any]]:
+        state = reply.state if reply is not None else self.coach.store.get(key)
+        if state is None or state.finished:
+            return None
+        return {"skill": state.skill_id, "problem": state.problem_text, "step": state.step_index + 1,
+                "steps": len(state.steps), "prompt": step_text(state)}
+
+    async def _do(self, op: str, key: int, body: Dict[str, Any]) -> Reply:
+        coach = self.coach
+        if op == "start":
+            topic = body.get("topic")
+            if topic is not None:
+                skill_id = find_topic(str(topic))
+                difficulty = body.get("difficulty", DIFFICULTIES[0])
+                if skill_id is None or difficulty not in DIFFICULTIES:
+                    raise ApiError(400, "unknown topic or difficulty")
+                return coach.practice(key, skill_id, difficulty)
+            problem = body.get("problem")
+            if not isinstance(problem, str) or not problem.strip():
+                raise ApiError(400, "problem or topic is required")
+            return await coach.start(key, problem.strip())
+        if op == "answer":
+            text = body.get("text")
+            if not isinstance(text, str) or not text.strip():
+                raise ApiError(400, "text is required")
+            return await coach.answer(key, text)
+        if op == "hint":
+            return coach.hint(key)
+        if op == "giveup":
+            return coach.giveup(key)
+        return coach.new(key)
+
+    async def run(self, op: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        if op not in OPS:
+            raise ApiError(404, f"unknown op {op!r}")
+        key = self._key(body)
+        user_lock = self._locks.get(key)
+        if user_lock is None:
+            user_lock = self._locks[key] = _UserLock()
+        user_lock.refs += 1
+        started = time.perf_counter()
+        try:
+            async with user_lock.lock:
+                await self.coach.store.load(key)
+                reply = await self._do(op, key, body)
+        finally:
+            HANDLER_LATENCY.labels("api." + op).observe(time.perf_counter() - started)
+            user_lock.refs -= 1
+            if not user_lock.refs:
+                del self._locks[key]
+        return {"ok": reply.ok, "messages": list(reply.texts), "session": self._session(key, reply)}
+
+    async def _run_safe(self, op: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        # one request of a batch: its error doesn't fail the others
+        try:
+            return await self.run(op, body)
+        except ApiError as e:
+            return {"ok": False, "error": str(e)}
+        except Exception:
+            log.exception("API %s failed", op)
+            return {"ok": False, "error": "internal error"}
+
+    async def batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        by_user: Dict[Any, List[int]] = {}
+        for i, body in enumerate(requests):
+            user = body.get("user")
+            # requests without a valid user fail in run(), one chain for all of them
+            by_user.setdefault(user if isinstance(user, int) else None, []).append(i)
+        results: List[Dict[str, Any]] = [{}] * len(requests)
+
+        async def user_chain(indexes: List[int]) -> None:
+            for i in indexes:
+                body = requests[i]
+                results[i] = await self._run_safe(str(body.get("op", "")), body)
+
+        await asyncio.gather(*(user_chain(indexes) for indexes in by_user.values()))
+        return results
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.token:
+            return True
+        return hmac.compare_digest(request.headers.get("Authorization", ""), "Bearer " + self.token)
+
+    async def _body(self, request: web.Request) -> Dict[str, Any]:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise ApiError(400, "body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "body must be a JSON object")
+        return body
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.json_response({"ok": False, "error": "unauthorized"}, status=401)
+        op = request.match_info.get("op", "session")
+        try:
+            if request.method == "GET":
+                # GET /v1/session?user=N: the current step, nothing changes
+                user = request.query.get("user", "")
+                key = self._key({"user": int(user) if user.isdigit() else None})
+                await self.coach.store.load(key)
+                return web.json_response({"ok": True, "session": self._session(key)})
+            body = await self._body(request)
+            if op == "batch":
+                requests = body.get("requests")
+                if not isinstance(requests, list) or not all(isinstance(r, dict) for r in requests):
+                    raise ApiError(400, "requests must be a list of objects")
+                if len(requests) > MAX_BATCH:
+                    raise ApiError(413, f"at most {MAX_BATCH} requests per batch")
+                return web.json_response({"ok": True, "results": await self.batch(requests)})
+            return web.json_response(await self.run(op, body))
+        except ApiError as e:
+            return web.json_response({"ok": False, "error": str(e)}, status=e.status)
+
+def build_app(server: ApiServer) -> web.Application:
+    app = web.Application()
+    app.router.add_get("/v1/session", server.handle)
+    app.router.add_post("/v1/{op}", server.handle)
+    return app
+
+def serve(dp, host: str, port: int, coach: Coach, token: str = "") -> None:
+    # runs the API between the dispatcher's startup and shutdown, like metrics.serve
+    runner = None
+
+    async def start_api():
+        nonlocal runner
+        runner = web.AppRunner(build_app(ApiServer(coach, token)), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        log.info("HTTP API on http://%s:%s/v1/", host, port)
+
+    async def stop_api():
+        if runner is not None:
+            await runner.cleanup()
+
+    dp.startup.register(start_api)
+    dp.shutdown.register(stop_api)
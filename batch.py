@@ -0,0 +1,147 @@
+
+# Runs a problem bank through the engine without Telegram.
+#   python -m bot.batch problems.jsonl [-o results.jsonl] [--workers 4] [--chunk-size 1000]
+#
+# Each input line is {"problem": "...", "answers": ["...", "/hint", ...]}
+# with optional "id" and "skill" (the expected skill; "text" works instead of
+# "problem", so classify_corpus.jsonl can be fed as is). Each output line has
+# the chosen skill and classifier scores, how many steps the answers got
+# through and which checker rejected which answer. The file is read and
+# written as a stream with a bounded number of chunks in flight, so memory
+# doesn't depend on its size; a summary goes to stderr.
+import argparse
+import json
+import sys
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Tuple
+
+from .engine.answers import parse_answer
+from .engine.skills import SKILLS, classifier
+
+def run_problem(item: Dict[str, Any]) -> Dict[str, Any]:
+    text = item.get("problem") or item.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("no problem text")
+    text = text.strip()
+    ranked = classifier().rank(text)
+    skill = SKILLS[ranked.best]
+    state = skill.init(text)
+    rejected, hints = [], 0
+    for answer in item.get("answers", ()):
+        if state.finished:
+            break
+        answer = str(answer).strip()
+        if answer == "/hint":
+            hints += 1
+            continue
+        step_index = state.step_index
+        checker = state.steps[step_index].answer_checker
+        feedback, _ = skill.next_step(state, parse_answer(answer))
+        if state.step_index == step_index and not state.finished:
+            rejected.append({"step": step_index + 1, "checker": checker, "answer": answer,
+                             "feedback": feedback})
+    result = {
+        "id": item.get("id"),
+        "skill": skill.id,
+        "scores": dict(ranked.ranked),
+        "ambiguous": ranked.ambiguous,
+        "parsed": state.problem is not None,
+        "steps": len(state.steps),
+        "reached": len(state.steps) if state.finished else state.step_index,
+        "finished": state.finished,
+        "hints": hints,
+        "rejected": rejected,
+    }
+    if "skill" in item:
+        result["expected"] = item["skill"]
+    return result
+
+def run_chunk(first_line: int, lines: List[str]) -> Tuple[List[str], Counter]:
+    # runs in a worker process: output lines plus summary counts for the chunk
+    out, summary = [], Counter()
+    for number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            result = {"line": number, **run_problem(json.loads(line))}
+        except Exception as e:
+            result = {"line": number, "error": f"{type(e).__name__}: {e}"}
+            summary["errors"] += 1
+        else:
+            summary["problems"] += 1
+            summary[f"skill:{result['skill']}"] += 1
+            summary["finished"] += result["finished"]
+            summary["unparsed"] += not result["parsed"]
+            if "expected" in result:
+                summary["misclassified"] += result["expected"] != result["skill"]
+            for r in result["rejected"]:
+                summary[f"rejected:{result['skill']}.{r['checker']}"] += 1
+        out.append(json.dumps(result, ensure_ascii=False))
+    return out, summary
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[Tuple[int, List[str]]]:
+    it = iter(lines)
+    first = 1
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield first, chunk
+        first += len(chunk)
+
+def run(lines: Iterable[str], out, workers: int = 0, chunk_size: int = 1000) -> Counter:
+    summary = Counter()
+    if workers <= 0:
+        for first, chunk in _chunks(lines, chunk_size):
+            results, counts = run_chunk(first, chunk)
+            out.writelines(r + "\n" for r in results)
+            summary.update(counts)
+        return summary
+    # results are written in input order; at most 2 chunks per worker wait
+    with ProcessPoolExecutor(workers) as pool:
+        pending: Deque[Future] = deque()
+        for first, chunk in _chunks(lines, chunk_size):
+            pending.append(pool.submit(run_chunk, first, chunk))
+            while len(pending) >= 2 * workers:
+                results, counts = pending.popleft().result()
+                out.writelines(r + "\n" for r in results)
+                summary.update(counts)
+        while pending:
+            results, counts = pending.popleft().result()
+            out.writelines(r + "\n" for r in results)
+            summary.update(counts)
+    return summary
+
+def print_summary(summary: Counter, file=sys.stderr) -> None:
+    for key in ("problems", "errors", "finished", "unparsed", "misclassified"):
+        print(f"{key:14} {summary[key]}", file=file)
+    for prefix in ("skill:", "rejected:"):
+        items = sorted(((k[len(prefix):], v) for k, v in summary.items() if k.startswith(prefix)),
+                       key=lambda kv: -kv[1])
+        for name, count in items:
+            print(f"  {prefix[:-1]:9} {name:32} {count}", file=file)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("input", help="JSONL file, - for stdin")
+    ap.add_argument("-o", "--output", default="-", help="JSONL file, - for stdout")
+    ap.add_argument("--workers", type=int, default=0, help="processes; 0 runs in this one")
+    ap.add_argument("--chunk-size", type=int, default=1000)
+    args = ap.parse_args(argv)
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        summary = run(src, dst, args.workers, args.chunk_size)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print_summary(summary)
+    return 1 if summary["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
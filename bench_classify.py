@@ -0,0 +1,51 @@
+
+# Accuracy and speed of the problem classifier on the labeled corpus.
+#   python -m bot.bench_classify [--min-accuracy 0.95]
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from .engine.skills import classifier
+
+CORPUS = Path(__file__).with_name("classify_corpus.jsonl")
+
+def load_corpus(path: Path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", type=Path, default=CORPUS)
+    ap.add_argument("--rounds", type=int, default=200)
+    ap.add_argument("--min-accuracy", type=float, default=0.0)
+    args = ap.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    clf = classifier()
+    wrong, ambiguous = [], 0
+    for item in corpus:
+        result = clf.rank(item["text"])
+        ambiguous += result.ambiguous
+        if result.best != item["skill"]:
+            wrong.append((item["text"], item["skill"], result.ranked))
+    accuracy = 1 - len(wrong) / len(corpus)
+
+    texts = [item["text"] for item in corpus]
+    t0 = time.perf_counter()
+    for _ in range(args.rounds):
+        for text in texts:
+            clf.rank(text)
+    elapsed = time.perf_counter() - t0
+    per_call_us = elapsed / (args.rounds * len(texts)) * 1e6
+
+    print(f"corpus:    {len(corpus)} problems")
+    print(f"accuracy:  {accuracy:.3f} ({len(wrong)} wrong, {ambiguous} ambiguous)")
+    print(f"speed:     {per_call_us:.2f} us/classification")
+    for text, expected, ranked in wrong:
+        print(f"  MISS {text!r}: expected {expected}, got {ranked}")
+    return 0 if accuracy >= args.min_accuracy else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+
+# End-to-end load test: the real Dispatcher and routers, simulated students,
+# a stub bot session instead of the network.
+#   python -m bot.bench_load [--students 2000] [--concurrency 500] [--out run.json] [--compare base.json]
+#
+# Every student picks a skill, sends a generated problem and walks through
+# all of its steps, mixing in wrong answers and /hint. Reports throughput,
+# handler latency percentiles (time spent in Dispatcher.feed_update) and peak
+# RSS; --out/--compare save and diff runs before and after a change.
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from fractions import Fraction
+from math import gcd
+from typing import Any, Dict, List
+
+os.environ.setdefault("BOT_TOKEN", "1:bench")
+# measure the handlers, not the flood limits
+os.environ.setdefault("OUTBOX_CHAT_INTERVAL", "0")
+os.environ.setdefault("OUTBOX_GLOBAL_RATE", "1000000000")
+os.environ.setdefault("METRICS_PORT", "0")
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.types import Chat, Message, Update
+
+from .main import build_dispatcher
+
+class StubSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout=None) -> Any:
+        self.calls += 1
+        if isinstance(method, SendMessage):
+            return Message(message_id=self.calls, date=datetime.now(),
+                           chat=Chat(id=method.chat_id, type="private"), text=method.text)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        raise NotImplementedError
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+def _signed(v: int) -> str:
+    return f"+ {v}" if v >= 0 else f"- {-v}"
+
+def _linear(rng: random.Random) -> List[str]:
+    a, x, b = rng.randint(2, 9), rng.randint(-10, 10), rng.randint(1, 20)
+    c = a * x + b
+    return [f"Реши: {a}x + {b} = {c}", str(a + 1), "/hint", str(a), str(b), str(c), str(c - b), str(x)]
+
+def _frac(rng: random.Random) -> List[str]:
+    d1, d2 = rng.randint(2, 12), rng.randint(2, 12)
+    n1, n2 = rng.randint(1, d1 - 1), rng.randint(1, d2 - 1)
+    lcd = d1 * d2 // gcd(d1, d2)
+    m1, m2 = n1 * lcd // d1, n2 * lcd // d2
+    total = Fraction(n1, d1) + Fraction(n2, d2)
+    return [f"{n1}/{d1} + {n2}/{d2}", f"{d1}, {d2}", "/hint", str(lcd), f"{m1}, {m2}",
+            str(m1 + m2), f"{total.numerator}/{total.denominator}"]
+
+def _quadratic(rng: random.Random) -> List[str]:
+    r1, r2 = rng.randint(-9, 9), rng.randint(-9, 9)
+    b, c = -(r1 + r2), r1 * r2
+    roots = "2" if r1 != r2 else "1"
+    return [f"x^2 {_signed(b)}x {_signed(c)} = 0", "1, 1, 1", f"1, {b}, {c}", "/hint", str(b * b - 4 * c),
+            roots, f"{r1}, {r2}" if r1 != r2 else str(r1)]
+
+def _proportion(rng: random.Random) -> List[str]:
+    a, b, k = rng.randint(1, 9), rng.randint(1, 9), rng.randint(1, 5)
+    c = a * k
+    return [f"{a}:{b} = {c}:x", "/hint", f"{a}/{b}", f"{a}·x = {b}·{c}", f"x = {b}·{c}/{a}", str(b * k)]
+
+SCRIPTS = [_linear, _frac, _quadratic, _proportion]
+
+class Student:
+    __slots__ = ("uid", "messages")
+
+    def __init__(self, uid: int, rng: random.Random):
+        self.uid = uid
+        self.messages = rng.choice(SCRIPTS)(rng)
+
+def _update(update_id: int, uid: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": "Student"},
+            "text": text,
+        },
+    })
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+async def run(students: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    session = StubSession()
+    bot = Bot(os.environ["BOT_TOKEN"], session=session)
+    dp = build_dispatcher(bot)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    rng = random.Random(seed)
+    pool = [Student(1_000_000 + i, rng) for i in range(students)]
+    latencies: List[float] = []
+    counter = iter(range(1, 10**9))
+    limit = asyncio.Semaphore(concurrency)
+
+    async def walk(student: Student) -> None:
+        async with limit:
+            for text in student.messages:
+                update = _update(next(counter), student.uid, text)
+                t0 = time.perf_counter()
+                await dp.feed_update(bot, update)
+                latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(walk(s) for s in pool))
+    elapsed = time.perf_counter() - started
+    outbox = dp["outbox"]
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+
+    latencies.sort()
+    return {
+        "students": students,
+        "concurrency": concurrency,
+        "updates": len(latencies),
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1e3, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1e3, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "api_calls": session.calls,
+        "messages_coalesced": outbox.stats.coalesced,
+    }
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write results as JSON")
+    ap.add_argument("--compare", help="JSON results of an earlier run to diff against")
+    args = ap.parse_args(argv)
+
+    result = asyncio.run(run(args.students, args.concurrency, args.seed))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    for key, value in result.items():
+        line = f"{key:20} {value}"
+        if baseline and isinstance(value, (int, float)) and baseline.get(key):
+            line += f"   ({(value - baseline[key]) / baseline[key]:+.1%} vs {baseline[key]})"
+        print(line)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# What instrumentation costs per update, next to the engine work it measures.
+#   python -m bot.bench_metrics [--rounds 20000] [--max-share 0.05]
+#
+# "metrics" is what one answered step records: the middleware around the
+# handler plus the attempt counters; "engine" is classifying a problem,
+# starting it and checking one answer. --max-share fails the run when the
+# metrics cost more than that fraction of the engine work.
+import argparse
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from .bench_classify import CORPUS, load_corpus
+from .engine.answers import parse_answer
+from .engine.skills import SKILLS, best_skill
+from .metrics import MetricsMiddleware, Registry, Counter, Histogram
+
+async def _noop(event, data):
+    return None
+
+def bench_metrics(rounds: int) -> float:
+    registry = Registry()
+    latency = registry.register(Histogram("handler_seconds", "", ("handler",)))
+    attempts = registry.register(Counter("attempts_total", "", ("skill", "checker")))
+    wrong = registry.register(Counter("wrong_total", "", ("skill", "checker")))
+    middleware = MetricsMiddleware(latency)
+    data = {"handler": SimpleNamespace(callback=bench_metrics)}
+
+    async def loop() -> float:
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            await middleware(_noop, None, data)
+            attempts.labels("linear_eq", "coef_a").inc()
+            wrong.labels("linear_eq", "coef_a").inc()
+        return time.perf_counter() - t0
+
+    async def baseline() -> float:
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            await _noop(None, data)
+        return time.perf_counter() - t0
+
+    return (asyncio.run(loop()) - asyncio.run(baseline())) / rounds
+
+def bench_engine(texts, rounds: int) -> float:
+    t0 = time.perf_counter()
+    n = 0
+    while n < rounds:
+        for text in texts:
+            skill = best_skill(text)
+            state = skill.init(text)
+            SKILLS[state.skill_id].next_step(state, parse_answer("1"))
+            n += 1
+    return (time.perf_counter() - t0) / n
+
+def bench_render(children: int) -> float:
+    registry = Registry()
+    latency = registry.register(Histogram("handler_seconds", "", ("handler",)))
+    attempts = registry.register(Counter("attempts_total", "", ("skill", "checker")))
+    for i in range(children):
+        attempts.labels(f"skill{i % 8}", f"checker{i}").inc()
+        latency.labels(f"handler{i % 6}").observe(0.001)
+    t0 = time.perf_counter()
+    registry.render()
+    return time.perf_counter() - t0
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=20000)
+    ap.add_argument("--max-share", type=float, default=1.0)
+    args = ap.parse_args(argv)
+
+    texts = [item["text"] for item in load_corpus(CORPUS)]
+    metrics_us = bench_metrics(args.rounds) * 1e6
+    engine_us = bench_engine(texts, args.rounds) * 1e6
+    share = metrics_us / engine_us
+    print(f"metrics:   {metrics_us:.2f} us/update")
+    print(f"engine:    {engine_us:.2f} us/update")
+    print(f"overhead:  {share:.1%} of engine work")
+    print(f"scrape:    {bench_render(200) * 1e3:.2f} ms for 200 label sets")
+    return 0 if share <= args.max_share else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
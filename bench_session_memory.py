@@ -0,0 +1,74 @@
+
+# Memory per live session, compared with giving every session its own copy of
+# the step list (how sessions were built before steps became shared templates).
+#   python -m bot.bench_session_memory [--sessions 20000]
+import argparse
+import gc
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from .engine.session import MemoryStore
+from .engine.skills import SKILLS
+
+PROBLEMS = {
+    "linear_eq": "2x + 5 = 17",
+    "frac_add": "1/3 + 1/4",
+    "quadratic_eq": "x^2 - 5x + 6 = 0",
+    "proportion": "3:4 = 6:x",
+}
+
+@dataclass
+class _CopiedStep:
+    prompt: str
+    hint_levels: List[str] = field(default_factory=list)
+    answer_checker: str = ""
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class _CopiedState:
+    skill_id: str
+    problem_text: str
+    step_index: int = 0
+    steps: List[_CopiedStep] = field(default_factory=list)
+    scratch: Dict[str, Any] = field(default_factory=dict)
+    finished: bool = False
+
+def _shared(skill_id: str, problem: str):
+    return SKILLS[skill_id].init(problem)
+
+def _copied(skill_id: str, problem: str):
+    steps = [_CopiedStep(s.prompt, list(s.hint_levels), s.answer_checker) for s in SKILLS[skill_id].steps]
+    return _CopiedState(skill_id=skill_id, problem_text=problem, steps=steps, scratch={})
+
+def measure(make, n: int) -> float:
+    items = list(PROBLEMS.items())
+    store = MemoryStore()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for uid in range(n):
+        skill_id, problem = items[uid % len(items)]
+        store.set(uid, make(skill_id, problem))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the store's own dict is the same for both layouts, leave it in: it is
+    # part of what a session costs
+    return (after - before) / n
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=20000)
+    args = ap.parse_args(argv)
+
+    shared = measure(_shared, args.sessions)
+    copied = measure(_copied, args.sessions)
+    print(f"sessions:          {args.sessions}")
+    print(f"shared templates:  {shared:8.0f} B/session")
+    print(f"copied step lists: {copied:8.0f} B/session")
+    print(f"ratio:             {copied / shared:8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
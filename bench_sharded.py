@@ -0,0 +1,100 @@
+
+# Throughput of the sharded runner for different worker counts.
+#   python -m bot.bench_sharded [--workers 1 2 4] [--students 2000]
+#
+# Simulated students (the same scripts as bench_load) send their messages in
+# waves: every student sends its next message, the wave ends when all replies
+# are back. The front is a bare ShardPool with a counting outbox, so the
+# numbers are the shards' work plus the pipe traffic, without the Bot API.
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict
+
+os.environ.setdefault("METRICS_PORT", "0")
+# one wave queues a whole crowd in each shard
+os.environ.setdefault("MAX_WAITING", "1000000")
+
+from .bench_load import Student
+from .sharded import ShardPool
+
+class CountingOutbox:
+    def __init__(self):
+        self.replies = 0
+        self.target = 0
+        self.done = asyncio.Event()
+
+    def expect(self, count: int) -> None:
+        self.replies = 0
+        self.target = count
+        self.done.clear()
+
+    def send(self, chat_id: int, *texts: str) -> None:
+        self.replies += 1
+        if self.replies >= self.target:
+            self.done.set()
+
+def _update_json(update_id: int, uid: int, text: str) -> str:
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": "Student"},
+            "text": text,
+        },
+    }, ensure_ascii=False)
+
+async def run(workers: int, students: int, seed: int) -> Dict[str, float]:
+    outbox = CountingOutbox()
+    pool = ShardPool(workers, outbox)
+    await pool.start()
+    counter = iter(range(1, 10**9))
+    try:
+        # wait until every shard has imported everything and answers
+        outbox.expect(workers)
+        for uid in range(workers):
+            pool.submit(uid, _update_json(next(counter), uid, "/new"))
+        await outbox.done.wait()
+
+        rng = random.Random(seed)
+        pool_students = [Student(1_000_000 + i, rng) for i in range(students)]
+        updates = 0
+        started = time.perf_counter()
+        for wave in range(max(len(s.messages) for s in pool_students)):
+            batch = [s for s in pool_students if wave < len(s.messages)]
+            outbox.expect(len(batch))
+            for s in batch:
+                pool.submit(s.uid, _update_json(next(counter), s.uid, s.messages[wave]))
+            await outbox.done.wait()
+            updates += len(batch)
+        elapsed = time.perf_counter() - started
+    finally:
+        await pool.stop()
+    return {"workers": workers, "updates": updates, "seconds": round(elapsed, 3),
+            "updates_per_s": round(updates / elapsed, 1)}
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--students", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    print(f"cpu cores: {os.cpu_count()}")
+    base = None
+    for workers in args.workers:
+        result = asyncio.run(run(workers, args.students, args.seed))
+        rate = result["updates_per_s"]
+        base = base or rate / workers
+        print(f"workers {workers:3}: {rate:10.1f} updates/s   "
+              f"speedup {rate / base:5.2f}x   efficiency {rate / base / workers:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# Cold start: time from launching `python -m bot.main` until its first
+# getUpdates reaches a local fake Bot API, plus the slowest imports on the way
+# (from `python -X importtime`). Fails when the median is over the budget:
+#   python -m bot.bench_startup [--runs 5] [--budget-ms 1500] [--top 15]
+# tests/test_startup.py runs the same check.
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+from .fake_bot_api import build_app
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+# what the bot imports before it polls: main and everything build_dispatcher
+# pulls in. Startup itself isn't run, so no worker process (whose own
+# importtime lines would land in the same stderr) is started.
+_STARTUP_IMPORTS = ("from {package}.main import build_bot, build_dispatcher; "
+                    "build_dispatcher(build_bot())")
+
+def _env(api_url: str = "") -> Dict[str, str]:
+    return dict(os.environ, BOT_TOKEN="1:startup", TELEGRAM_API_URL=api_url, BOT_MODE="polling",
+                WORKERS="1", METRICS_PORT="0", SESSION_STORE="memory",
+                PYTHONPATH=os.pathsep.join(filter(None, [str(PACKAGE_DIR.parent), os.environ.get("PYTHONPATH")])))
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    # (module, self us, cumulative us) of the imports done by the bot itself,
+    # each including everything it pulled in
+    result = []
+    for line in stderr.splitlines():
+        m = _IMPORT_LINE.match(line)
+        if m and len(m.group(3)) == 1:
+            result.append((m.group(4), int(m.group(1)), int(m.group(2))))
+    return result
+
+def startup_imports() -> List[Tuple[str, int, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _STARTUP_IMPORTS.format(package=PACKAGE_DIR.name)],
+        env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    return parse_importtime(proc.stderr.decode(errors="replace"))
+
+async def measure_once(api_url: str, polled: asyncio.Event, timeout: float) -> float:
+    polled.clear()
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", f"{PACKAGE_DIR.name}.main",
+        env=_env(api_url), stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    try:
+        await asyncio.wait_for(polled.wait(), timeout)
+        return time.perf_counter() - started
+    finally:
+        if proc.returncode is None:
+            proc.terminate()
+        await proc.wait()
+
+async def run(runs: int, timeout: float) -> List[float]:
+    app = build_app(chat_interval=0)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    times = []
+    try:
+        for _ in range(runs):
+            times.append(await measure_once(f"http://127.0.0.1:{port}", app["api"].polled, timeout))
+    finally:
+        await runner.cleanup()
+    return times
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=1500)
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args(argv)
+
+    times = asyncio.run(run(args.runs, args.timeout))
+    imports = startup_imports()
+    median_ms = statistics.median(times) * 1e3
+    print(f"time to first poll: median {median_ms:.0f} ms, "
+          f"min {min(times) * 1e3:.0f} ms, max {max(times) * 1e3:.0f} ms ({len(times)} runs)")
+    print(f"imports: {sum(c for _, _, c in imports) / 1e3:.0f} ms in {len(imports)} top-level modules")
+    for name, _, cumulative in sorted(imports, key=lambda i: -i[2])[:args.top]:
+        print(f"  {cumulative / 1e3:8.1f} ms  {name}")
+    if median_ms > args.budget_ms:
+        print(f"over budget: {median_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
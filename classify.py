@@ -1,26 +1,64 @@
 
 import re
-from typing import List, Tuple
+from typing import Dict, List, NamedTuple, Tuple
 
-def classify(problem: str) -> List[Tuple[str, float]]:
-    text = problem.replace(" ", "").lower()
-    scores = []
+FALLBACK_SCORE = 0.3
+
+_CHARS = str.maketrans({"²": "^2", "−": "-", "–": "-", "·": "*", "×": "*", "÷": ":"})
+# Cyrillic "х" is what students usually type for x; only replace it outside words
+_CYRILLIC_X = re.compile(r"(?<![а-яё])х(?![а-яё])")
+
+def unify_symbols(problem: str) -> str:
+    return _CYRILLIC_X.sub("x", problem.lower().translate(_CHARS)).replace("**", "^")
 
-    if re.search(r"=.+x", text) or re.search(r"x.+=", text):
-        if re.search(r"x\^2", text):
-            pass
-        else:
-            scores.append(("linear_eq", 0.8))
+def normalize(problem: str) -> str:
+    return "".join(unify_symbols(problem).split())
 
-    if re.search(r"x\^2", text) or "x²" in text or "discriminant" in text:
-        scores.append(("quadratic_eq", 0.9))
+class Classification(NamedTuple):
+    ranked: List[Tuple[str, float]]
+    ambiguous: bool
 
-    if re.search(r"\d+/\d+\+\d+/\d+", text):
-        scores.append(("frac_add", 0.85))
+    @property
+    def best(self) -> str:
+        return self.ranked[0][0]
 
-    if (":" in problem and "=" in problem):
-        scores.append(("proportion", 0.7))
+    def score(self, skill_id: str) -> float:
+        for sid, score in self.ranked:
+            if sid == skill_id:
+                return score
+        return 0.0
 
-    if not scores:
-        scores.append(("linear_eq", 0.3))
-    return sorted(scores, key=lambda t: t[1], reverse=True)
+# All skill signatures ({regex: weight} per skill) are compiled into a single
+# alternation, so classifying is one finditer over the normalized text. Longer
+# patterns are tried first and matches don't overlap, so e.g. "x^2" is one
+# feature and does not also count as a bare "x". A pattern shared by several
+# skills is one feature contributing to each of them (weights may be negative).
+class Classifier:
+    def __init__(self, signatures: Dict[str, Dict[str, float]], default: str, margin: float = 0.1):
+        self.default = default
+        self.margin = margin
+        owners: Dict[str, List[Tuple[str, float]]] = {}
+        for skill_id, signature in signatures.items():
+            for pattern, weight in signature.items():
+                owners.setdefault(pattern, []).append((skill_id, weight))
+        patterns = sorted(owners, key=len, reverse=True)
+        self._regex = re.compile("|".join(f"(?P<f{i}>{p})" for i, p in enumerate(patterns)))
+        self._weights = {f"f{i}": tuple(owners[p]) for i, p in enumerate(patterns)}
+        self._skills = tuple(signatures)
+
+    def rank(self, problem: str) -> Classification:
+        features = {m.lastgroup for m in self._regex.finditer(normalize(problem))}
+        scores = dict.fromkeys(self._skills, 0.0)
+        for name in features:
+            for skill_id, weight in self._weights[name]:
+                scores[skill_id] += weight
+        ranked = sorted(((s, min(v, 1.0)) for s, v in scores.items() if v > 0),
+                        key=lambda t: t[1], reverse=True)
+        if not ranked:
+            return Classification([(self.default, FALLBACK_SCORE)], True)
+        ambiguous = len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.margin
+        return Classification(ranked, ambiguous)
+
+def classify(problem: str) -> List[Tuple[str, float]]:
+    from .skills import classifier
+    return classifier().rank(problem).ranked
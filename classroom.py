@@ -0,0 +1,90 @@
+
+import secrets
+from typing import Dict, List, NamedTuple, Optional, Set
+from weakref import WeakValueDictionary
+
+from .session import TutorState
+
+_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+class Progress(NamedTuple):
+    # students on each step
+    steps: List[int]
+    solved: int
+    dropped: int
+
+# One problem pushed to a class, classified and parsed once: steps, parsed
+# problem and solution trace of the template session are shared by every
+# student's session, which only adds its own step index, hints and scratch.
+# counts[i] is how many students are on step i (counts[-1]: solved); Coach
+# reports every move, so reading progress never touches the sessions. A
+# session that expires stays counted on the step it was on.
+class Assignment:
+    __slots__ = ("id", "skill", "template", "counts", "dropped", "__weakref__")
+
+    def __init__(self, skill, problem_text: str):
+        # random, so a row saved before a restart can't match a new assignment
+        self.id = secrets.token_hex(8)
+        self.skill = skill
+        self.template = skill.init(problem_text)
+        self.counts: List[int] = [0] * (len(self.template.steps) + 1)
+        self.dropped = 0
+        _live[self.id] = self
+
+    def start(self) -> TutorState:
+        t = self.template
+        self.counts[0] += 1
+        return TutorState(skill_id=t.skill_id, problem_text=t.problem_text, steps=t.steps,
+                          problem=t.problem, trace=t.trace, assignment=self)
+
+    def advance(self, old_step: int, new_step: int) -> None:
+        self.counts[old_step] -= 1
+        self.counts[new_step] += 1
+
+    def drop(self, step: int) -> None:
+        # the student started something else
+        self.counts[step] -= 1
+        self.dropped += 1
+
+    def progress(self) -> Progress:
+        return Progress(self.counts[:-1], self.counts[-1], self.dropped)
+
+# Assignments still referenced by a class or a session, by id: SQLiteStore
+# keeps the id with a session and finds the assignment again when it loads it.
+_live: "WeakValueDictionary[str, Assignment]" = WeakValueDictionary()
+
+def find_assignment(assignment_id: Optional[str]) -> Optional[Assignment]:
+    return _live.get(assignment_id) if assignment_id is not None else None
+
+class Classroom:
+    __slots__ = ("code", "teacher_id", "students", "assignment")
+
+    def __init__(self, code: str, teacher_id: int):
+        self.code = code
+        self.teacher_id = teacher_id
+        self.students: Set[int] = set()
+        self.assignment: Optional[Assignment] = None
+
+class ClassroomRegistry:
+    def __init__(self, code_length: int = 6):
+        self.code_length = code_length
+        self._by_code: Dict[str, Classroom] = {}
+        self._by_teacher: Dict[int, Classroom] = {}
+
+    def create(self, teacher_id: int) -> Classroom:
+        # a teacher runs one class at a time; a new one replaces the old
+        old = self._by_teacher.pop(teacher_id, None)
+        if old is not None:
+            del self._by_code[old.code]
+        while True:
+            code = "".join(secrets.choice(_CODE_ALPHABET) for _ in range(self.code_length))
+            if code not in self._by_code:
+                break
+        room = self._by_code[code] = self._by_teacher[teacher_id] = Classroom(code, teacher_id)
+        return room
+
+    def get(self, code: str) -> Optional[Classroom]:
+        return self._by_code.get(code.strip().upper())
+
+    def of_teacher(self, teacher_id: int) -> Optional[Classroom]:
+        return self._by_teacher.get(teacher_id)
@@ -0,0 +1,176 @@
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from .engine.answers import parse_answer
+from .engine.practice import TOPICS, ProblemPool
+from .engine.session import SessionStore, TutorState
+from .events import EventLog
+from .metrics import PROBLEMS_STARTED, STEP_ATTEMPTS, STEP_WRONG, HINTS, COMPLETIONS, GIVEUPS
+from .reminders import IDLE, ReminderScheduler
+
+def _skills():
+    # engine.skills (every built-in skill, the classifier, problem parsing) is
+    # imported with the first problem rather than while the bot starts
+    from .engine import skills
+    return skills
+
+def step_text(state: TutorState) -> str:
+    step = state.steps[state.step_index]
+    return f"Шаг {state.step_index+1}/{len(state.steps)}:\n{step.prompt}"
+
+@dataclass(frozen=True)
+class Reply:
+    # messages for the student, in order
+    texts: Tuple[str, ...]
+    # the session after the action; None when there is none (or it just finished)
+    state: Optional[TutorState] = None
+    # False when the action needed a problem in progress and there was none
+    ok: bool = True
+
+# What the bot does with a student's message or command, without Telegram:
+# the handlers in handlers/tutor.py and the HTTP API in api.py both call it
+# and only deliver the texts. Callers run one action per user at a time
+# (ConcurrencyMiddleware, api.ApiServer). `reminders` is None for clients
+# that can't receive unsolicited messages.
+class Coach:
+    def __init__(self, store: SessionStore, events: EventLog, practice: ProblemPool,
+                 reminders: Optional[ReminderScheduler] = None):
+        self.store = store
+        self.events = events
+        self.practice_pool = practice
+        self.reminders = reminders
+
+    def _active(self, user_id: int) -> None:
+        if self.reminders is not None:
+            self.reminders.active(user_id)
+
+    def abandon(self, user_id: int, state: TutorState) -> None:
+        # the student moves on from an unfinished problem
+        if state.finished:
+            return
+        if self.reminders is not None:
+            self.reminders.cancel(user_id, IDLE)
+        self.events.emit("abandon", user_id, skill=state.skill_id, step=state.step_index,
+                         checker=state.steps[state.step_index].answer_checker)
+        if state.assignment is not None:
+            state.assignment.drop(state.step_index)
+
+    def new(self, user_id: int) -> Reply:
+        state = self.store.get(user_id)
+        if state is not None:
+            self.abandon(user_id, state)
+        self.store.clear(user_id)
+        return Reply(("Ок! Пришли новое задание текстом.",))
+
+    def hint(self, user_id: int) -> Reply:
+        state = self.store.get(user_id)
+        if not state or state.finished:
+            return Reply(("Сначала начни задачу. Пришли условие или используй /new.",), ok=False)
+        step = state.steps[state.step_index]
+        used = state.hints_used
+        if used >= len(step.hint_levels):
+            return Reply(("Больше подсказок нет — попробуй сформулировать шаг своими словами.",), state)
+        hint = step.hint_levels[used]
+        state.hints_used = used + 1
+        state.mistakes += 1
+        self._active(user_id)
+        HINTS.labels(state.skill_id, step.answer_checker).inc()
+        self.events.emit("hint", user_id, skill=state.skill_id, step=state.step_index,
+                         checker=step.answer_checker, level=used + 1)
+        self.store.set(user_id, state)
+        return Reply((f"Подсказка: {hint}",), state)
+
+    def giveup(self, user_id: int) -> Reply:
+        state = self.store.get(user_id)
+        if not state:
+            return Reply(("Нет активной задачи. Пришли условие для начала.",), ok=False)
+        GIVEUPS.labels(state.skill_id).inc()
+        self.events.emit("giveup", user_id, skill=state.skill_id, step=state.step_index,
+                         checker=state.steps[state.step_index].answer_checker)
+        skill = _skills().SKILLS.get(state.skill_id)
+        if skill and skill.giveup_plan:
+            text = skill.giveup_plan
+        else:
+            text = "Общий план: раздели на шаги и двигайся от определения к преобразованиям."
+        return Reply((text + "\n\nЧтобы продолжить — ответь на текущий шаг или используй /hint.",), state)
+
+    async def start(self, user_id: int, problem: str, **fields) -> Reply:
+        # `fields` go into the "start" event (practice difficulty, classroom)
+        skill = _skills().best_skill(problem)
+        await skill.prepare(problem)
+        old = self.store.get(user_id)
+        if old is not None:
+            self.abandon(user_id, old)
+        state = skill.init(problem)
+        self.store.set(user_id, state)
+        PROBLEMS_STARTED.labels(skill.id).inc()
+        self.events.emit("start", user_id, skill=skill.id, steps=len(state.steps),
+                         parsed=state.problem is not None, **fields)
+        self._active(user_id)
+        return Reply(("Принял задачу. Я не даю ответ, а веду тебя вопросами к решению. ✍️",
+                      step_text(state)), state)
+
+    def practice(self, user_id: int, skill_id: str, difficulty: int) -> Reply:
+        old = self.store.get(user_id)
+        if old is not None:
+            self.abandon(user_id, old)
+        problem = self.practice_pool.take(skill_id, difficulty)
+        skill = _skills().SKILLS[skill_id]
+        state = skill.init(problem)
+        self.store.set(user_id, state)
+        PROBLEMS_STARTED.labels(skill.id).inc()
+        self.events.emit("start", user_id, skill=skill.id, steps=len(state.steps),
+                         parsed=state.problem is not None, practice=difficulty)
+        self._active(user_id)
+        return Reply((f"Задача для тренировки ({TOPICS[skill_id][0]}, сложность {difficulty}):\n{problem}",
+                      step_text(state)), state)
+
+    def assign(self, user_id: int, assignment, classroom: str) -> Reply:
+        # a classroom.Assignment pushed by the teacher of `classroom`
+        old = self.store.get(user_id)
+        if old is not None:
+            self.abandon(user_id, old)
+        state = assignment.start()
+        self.store.set(user_id, state)
+        PROBLEMS_STARTED.labels(state.skill_id).inc()
+        self.events.emit("start", user_id, skill=state.skill_id, steps=len(state.steps),
+                         parsed=state.problem is not None, classroom=classroom)
+        self._active(user_id)
+        return Reply((f"Задача от учителя:\n{state.problem_text}", step_text(state)), state)
+
+    async def answer(self, user_id: int, text: str) -> Reply:
+        state = self.store.get(user_id)
+        if not state:
+            return Reply(("Нет активной задачи. Пришли условие для начала.",), ok=False)
+        skill = _skills().SKILLS[state.skill_id]
+        step_index = state.step_index
+        checker = state.steps[step_index].answer_checker
+        # parsed once here; the step's checker gets the typed answer
+        feedback, next_step = await skill.anext_step(state, parse_answer(text))
+        STEP_ATTEMPTS.labels(skill.id, checker).inc()
+        accepted = state.step_index != step_index
+        if accepted and state.assignment is not None:
+            state.assignment.advance(step_index, state.step_index)
+        self.events.emit("answer", user_id, skill=skill.id, step=step_index, checker=checker, ok=accepted)
+        if not accepted:
+            STEP_WRONG.labels(skill.id, checker).inc()
+            state.mistakes += 1
+        if next_step is None:
+            COMPLETIONS.labels(skill.id).inc()
+            self.events.emit("finish", user_id, skill=skill.id)
+            if self.reminders is not None:
+                self.reminders.finished(user_id, skill.id, state.mistakes)
+            self.store.clear(user_id)
+            more = (f"Пришли текст или возьми похожую: /practice {TOPICS[skill.id][1][0]}"
+                    if skill.id in TOPICS else "Используй /new или пришли текст.")
+            return Reply((feedback + "\n\nГотов(а) к новой задаче? " + more,))
+        self.store.set(user_id, state)
+        self._active(user_id)
+        return Reply((feedback, step_text(state)), state)
+
+    async def text(self, user_id: int, text: str) -> Reply:
+        # a plain message: a new problem, or an answer to the current step
+        if not self.store.get(user_id):
+            return await self.start(user_id, text.strip())
+        return await self.answer(user_id, text)
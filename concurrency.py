@@ -0,0 +1,151 @@
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from .metrics import QUEUE_WAIT, SHED
+
+BUSY_TEXT = ("Сейчас много учеников одновременно 🙏 "
+             "Подожди минутку и отправь сообщение ещё раз.")
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class ConcurrencyStats:
+    in_flight: int = 0
+    # updates waiting for their user's previous update or for a free slot
+    waiting: int = 0
+    processed: int = 0
+    shed: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.processed if self.processed else 0.0
+
+class _UserLock:
+    __slots__ = ("lock", "refs")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.refs = 0
+
+# Outer update middleware. Updates of one user run one after another (so two
+# quick messages can't both advance the same TutorState), and at most
+# `max_in_flight` handlers run at once. A user's lock only exists while that
+# user has updates in flight or queued. With more than `max_waiting` updates
+# queued, new ones are dropped with a polite reply instead of piling up.
+class ConcurrencyMiddleware(BaseMiddleware):
+    def __init__(self, max_in_flight: int = 64, max_waiting: int = 1000):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.stats = ConcurrencyStats()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._locks: Dict[int, _UserLock] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self.stats.waiting >= self.max_waiting:
+            self.stats.shed += 1
+            SHED.inc()
+            await self._reply_busy(data)
+            return None
+
+        user = data.get("event_from_user")
+        user_lock = None
+        if user is not None:
+            user_lock = self._locks.get(user.id)
+            if user_lock is None:
+                user_lock = self._locks[user.id] = _UserLock()
+            user_lock.refs += 1
+        try:
+            started = time.monotonic()
+            self.stats.waiting += 1
+            try:
+                if user_lock is not None:
+                    await user_lock.lock.acquire()
+                try:
+                    await self._slots.acquire()
+                except BaseException:
+                    if user_lock is not None:
+                        user_lock.lock.release()
+                    raise
+            finally:
+                self.stats.waiting -= 1
+            waited = time.monotonic() - started
+            self.stats.wait_total += waited
+            self.stats.wait_max = max(self.stats.wait_max, waited)
+            QUEUE_WAIT.observe(waited)
+
+            self.stats.in_flight += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.stats.in_flight -= 1
+                self.stats.processed += 1
+                self._slots.release()
+                if user_lock is not None:
+                    user_lock.lock.release()
+        finally:
+            if user_lock is not None:
+                user_lock.refs -= 1
+                if not user_lock.refs:
+                    del self._locks[user.id]
+
+    @asynccontextmanager
+    async def user(self, user_id: int):
+        # holds a user's lock outside of their own updates (a teacher's /push
+        # replacing their session); their updates wait meanwhile
+        user_lock = self._locks.get(user_id)
+        if user_lock is None:
+            user_lock = self._locks[user_id] = _UserLock()
+        user_lock.refs += 1
+        try:
+            async with user_lock.lock:
+                yield
+        finally:
+            user_lock.refs -= 1
+            if not user_lock.refs:
+                del self._locks[user_id]
+
+    async def _reply_busy(self, data: Dict[str, Any]) -> None:
+        chat = data.get("event_chat")
+        if chat is None:
+            return
+        outbox = data.get("outbox")
+        if outbox is not None:
+            outbox.send(chat.id, BUSY_TEXT)
+            return
+        try:
+            await data["bot"].send_message(chat.id, BUSY_TEXT)
+        except Exception:
+            log.warning("Could not send busy reply to chat %s", chat.id)
+
+# Inner message middleware: brings the sender's session into the store's
+# cache (see SQLiteStore.load) before the handler runs. It runs under the
+# user's lock, so nothing else changes the session meanwhile.
+class SessionLoadMiddleware(BaseMiddleware):
+    def __init__(self, store):
+        self.store = store
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None:
+            await self.store.load(user.id)
+        return await handler(event, data)
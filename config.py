@@ -1,7 +1,99 @@
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass
+from functools import lru_cache
 
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    raise RuntimeError("BOT_TOKEN is not set. Put it in .env or environment.")
+@dataclass(frozen=True)
+class Settings:
+    bot_token: str
+
+    # "memory" keeps sessions forever, "lru" caps them and expires idle ones,
+    # "sqlite" persists them to SESSION_DB with an "lru" cache in front
+    session_store: str = "memory"
+    session_db: str = "sessions.db"
+    session_max_count: int = 10000
+    session_idle_ttl: float = 3600
+
+    # "polling" or "webhook"; in webhook mode set_webhook is only called when
+    # WEBHOOK_URL is given, so the server can be exercised locally with plain POSTs
+    bot_mode: str = "polling"
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_max_concurrency: int = 64
+    webhook_max_pending: int = 1024
+
+    # more than 1 runs the handlers in WORKERS processes, each user always on the
+    # same one; this process keeps the Telegram connection and the outbox
+    workers: int = 1
+
+    # update_ids remembered for dropping redelivered updates: for how long and
+    # at most how many
+    dedup_window: float = 600
+    dedup_max_size: int = 100000
+
+    # processes checking free-form expressions with sympy, and how long one
+    # check may take; an answer not checked in time is not accepted, the
+    # student is asked to write it more simply
+    symbolic_workers: int = 2
+    symbolic_timeout: float = 2.0
+
+    # ready /practice problems per skill and difficulty; refilled in the
+    # background when a quarter is left
+    practice_pool_size: int = 200
+
+    # "you stopped at step 3/5" this many seconds after the last answer, 0 turns
+    # it off (keep it under SESSION_IDLE_TTL for lru/sqlite); reviews of skills
+    # a student struggled with come after 1, 3, 7, 21 days. REMINDERS_DB keeps
+    # them across restarts; at most REMINDERS_RATE are sent per second
+    remind_idle_after: float = 1800
+    reminders_db: str = ""
+    reminders_rate: float = 5
+
+    # learning events (see events.py) go to rotating gzip JSONL files in
+    # EVENTS_DIR, empty turns them off; at most EVENTS_MAX_BUFFER wait in memory
+    # for the writer, more are dropped
+    events_dir: str = ""
+    events_max_buffer: int = 100000
+
+    # handlers running at once, and updates allowed to queue behind them before
+    # new ones are turned away with a "busy" reply
+    max_in_flight: int = 64
+    max_waiting: int = 1000
+
+    # outgoing messages: at most one per chat every OUTBOX_CHAT_INTERVAL seconds
+    # and OUTBOX_GLOBAL_RATE per second overall
+    outbox_chat_interval: float = 1.0
+    outbox_global_rate: float = 25
+    # another Bot API server, e.g. http://localhost:8081 for fake_bot_api
+    telegram_api_url: str = ""
+
+    # user ids (comma-separated) allowed to run /profile and /memtrace
+    admin_ids: str = ""
+
+    # Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics; 0 turns it off
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9101
+
+    # JSON API for web and mobile clients on http://API_HOST:API_PORT/v1/; 0 turns
+    # it off. With API_TOKEN set, requests need "Authorization: Bearer <token>"
+    api_host: str = "127.0.0.1"
+    api_port: int = 0
+    api_token: str = ""
+
+# Read once, on first use: importing this module has no side effects, so the
+# engine, the benchmarks and the tools can be imported without a token or .env.
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if not os.getenv("BOT_TOKEN"):
+        raise RuntimeError("BOT_TOKEN is not set. Put it in .env or environment.")
+    values = {}
+    for name, field in Settings.__dataclass_fields__.items():
+        raw = os.getenv(name.upper())
+        if raw is not None:
+            values[name] = field.type(raw)
+    return Settings(**values)
@@ -0,0 +1,56 @@
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from .metrics import DUPLICATES
+
+@dataclass
+class DedupStats:
+    seen: int = 0
+    dropped: int = 0
+
+# Outer update middleware, first in the chain: an update_id seen within the
+# last `window` seconds is dropped before any other middleware or handler
+# runs, so a redelivered answer can't advance a session twice. Ids are kept
+# in arrival order, which makes the oldest ones the first to expire or be
+# evicted (at most `max_size` are remembered).
+class DedupMiddleware(BaseMiddleware):
+    def __init__(self, window: float = 600.0, max_size: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.max_size = max_size
+        self.stats = DedupStats()
+        self._clock = clock
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+
+    def is_duplicate(self, update_id: int) -> bool:
+        now = self._clock()
+        seen = self._seen
+        while seen:
+            oldest = next(iter(seen.values()))
+            if now - oldest <= self.window and len(seen) < self.max_size:
+                break
+            seen.popitem(last=False)
+        if update_id in seen:
+            return True
+        seen[update_id] = now
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            self.stats.seen += 1
+            if self.is_duplicate(event.update_id):
+                self.stats.dropped += 1
+                DUPLICATES.inc()
+                return None
+        return await handler(event, data)
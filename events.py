@@ -0,0 +1,244 @@
+
+# Learning events for offline analysis: problems started, answers to each
+# step (accepted or not), hints, give-ups, finished and abandoned problems.
+#   python -m bot.events events/ [--kind answer hint] [--user 42]   # JSONL to stdout
+#   python -m bot.events events/ --summary                          # per-step table
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from statistics import median
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+FILE_PREFIX = "events-"
+FILE_SUFFIX = ".jsonl.gz"
+
+@dataclass
+class EventStats:
+    emitted: int = 0
+    written: int = 0
+    # buffer full, or the batch couldn't be written
+    dropped: int = 0
+    files: int = 0
+
+# Handlers call emit(), which only appends a tuple to a bounded deque; a
+# background task takes the whole buffer every `flush_interval` seconds (or as
+# soon as `batch_size` events wait) and a dedicated thread serializes it and
+# appends it to the current file as one gzip member, so a file is readable up
+# to its last flush even if the process dies. Files rotate after
+# `max_file_bytes` and carry the pid, so shards never share one. The buffer is
+# never allowed to slow a reply down: when `max_buffer` events are already
+# waiting, new ones are dropped and counted. With no directory the log is off
+# and emit() returns at once.
+class EventLog:
+    def __init__(self, directory: Optional[str], max_buffer: int = 100_000, batch_size: int = 5000,
+                 flush_interval: float = 1.0, max_file_bytes: int = 64 << 20, compresslevel: int = 6):
+        self.directory = directory or None
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.compresslevel = compresslevel
+        self.stats = EventStats()
+        self._buffer: Deque[Tuple[float, str, int, Dict[str, Any]]] = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._path: Optional[str] = None
+        self._file_bytes = 0
+        self._reported_drops = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def emit(self, kind: str, user_id: int, **fields: Any) -> None:
+        if self.directory is None:
+            return
+        self.stats.emitted += 1
+        buf = self._buffer
+        if len(buf) >= self.max_buffer:
+            self.stats.dropped += 1
+            return
+        buf.append((time.time(), kind, user_id, fields))
+        if len(buf) == self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    def _new_path(self) -> str:
+        self.stats.files += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        return os.path.join(self.directory, f"{FILE_PREFIX}{stamp}-{os.getpid()}-{self.stats.files}{FILE_SUFFIX}")
+
+    def _write(self, batch: List[Tuple[float, str, int, Dict[str, Any]]]) -> None:
+        lines = "".join(
+            json.dumps({"t": round(t, 3), "kind": kind, "user": user_id, **fields},
+                       ensure_ascii=False, separators=(",", ":")) + "\n"
+            for t, kind, user_id, fields in batch)
+        if self._path is None or self._file_bytes >= self.max_file_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = self._new_path()
+        with gzip.open(self._path, "at", encoding="utf-8", compresslevel=self.compresslevel) as f:
+            f.write(lines)
+        self._file_bytes = os.path.getsize(self._path)
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = list(self._buffer), deque()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+        except Exception:
+            log.exception("Failed to write %d events, dropping them", len(batch))
+            self.stats.dropped += len(batch)
+            # the file may be broken now; start a new one
+            self._path = None
+        else:
+            self.stats.written += len(batch)
+        if self.stats.dropped > self._reported_drops:
+            log.warning("%d events dropped so far", self.stats.dropped)
+            self._reported_drops = self.stats.dropped
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        if self.directory is None or self._flusher is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-log")
+        self._wake = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except asyncio.CancelledError:
+            pass
+        self._flusher = None
+        await self.flush()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+def event_files(paths: Iterable[str]) -> List[str]:
+    # directories are expanded to their event files; names sort by time
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)))
+        else:
+            files.append(path)
+    return files
+
+def read_events(paths: Iterable[str], kinds: Optional[Iterable[str]] = None,
+                user_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    # Streams events file by file, line by line. A file cut short by a crash
+    # is read up to its last complete flush.
+    kinds = set(kinds) if kinds else None
+    for path in event_files(paths):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    event = json.loads(line)
+                    if kinds is not None and event["kind"] not in kinds:
+                        continue
+                    if user_id is not None and event["user"] != user_id:
+                        continue
+                    yield event
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            log.warning("%s is truncated: %s", path, e)
+
+@dataclass
+class StepSummary:
+    answers: int = 0
+    wrong: int = 0
+    hints: int = 0
+    giveups: int = 0
+    abandoned: int = 0
+
+def summarize(events: Iterable[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, int, str], StepSummary],
+                                                         Dict[Tuple[str, int, str], List[float]]]:
+    # Per (skill, step, checker): counts, and the seconds each student spent
+    # on the step, from the problem's start or the previous accepted answer
+    # to the answer that was accepted. Needs events in time order per user.
+    steps: Dict[Tuple[str, int, str], StepSummary] = defaultdict(StepSummary)
+    durations: Dict[Tuple[str, int, str], List[float]] = defaultdict(list)
+    since: Dict[int, float] = {}
+    for e in events:
+        kind, user = e["kind"], e["user"]
+        if kind == "start":
+            since[user] = e["t"]
+            continue
+        if "step" not in e:
+            since.pop(user, None)
+            continue
+        key = (e["skill"], e["step"], e["checker"])
+        s = steps[key]
+        if kind == "answer":
+            s.answers += 1
+            if not e["ok"]:
+                s.wrong += 1
+            elif user in since:
+                durations[key].append(e["t"] - since[user])
+                since[user] = e["t"]
+        elif kind == "hint":
+            s.hints += 1
+        elif kind == "giveup":
+            s.giveups += 1
+        elif kind == "abandon":
+            s.abandoned += 1
+            since.pop(user, None)
+    return steps, durations
+
+def print_summary(steps, durations, file=sys.stdout) -> None:
+    print(f"{'skill':20} {'step':>4} {'checker':16} {'answers':>7} {'wrong':>6} {'hints':>6} "
+          f"{'giveup':>6} {'left':>5} {'median s':>9} {'p90 s':>7}", file=file)
+    for key in sorted(steps):
+        skill, step, checker = key
+        s = steps[key]
+        times = sorted(durations.get(key, ()))
+        med = f"{median(times):.1f}" if times else "-"
+        p90 = f"{times[int(0.9 * (len(times) - 1))]:.1f}" if times else "-"
+        print(f"{skill:20} {step + 1:>4} {checker:16} {s.answers:>7} {s.wrong:>6} {s.hints:>6} "
+              f"{s.giveups:>6} {s.abandoned:>5} {med:>9} {p90:>7}", file=file)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="+", help="EVENTS_DIR or event files")
+    ap.add_argument("--kind", nargs="*", help="only these kinds (start, answer, hint, giveup, finish, abandon)")
+    ap.add_argument("--user", type=int)
+    ap.add_argument("--summary", action="store_true", help="per-step table instead of events")
+    args = ap.parse_args(argv)
+
+    events = read_events(args.paths, args.kind, args.user)
+    if args.summary:
+        print_summary(*summarize(events))
+        return 0
+    try:
+        for event in events:
+            sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+    except BrokenPipeError:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+
+# A tiny stand-in for the Telegram Bot API, for running the bot locally with
+# TELEGRAM_API_URL=http://localhost:8081 (any BOT_TOKEN of the form 1:x).
+#   python -m bot.fake_bot_api [--port 8081] [--chat-interval 1.0]
+#
+# sendMessage answers 429 with retry_after when a chat gets messages faster
+# than --chat-interval, like the real API does. Updates POSTed to /inject are
+# handed out by getUpdates; GET /stats shows what the bot has sent.
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Math Coach", "username": "math_coach_bot"}
+
+class FakeBotAPI:
+    def __init__(self, chat_interval: float = 1.0):
+        self.chat_interval = chat_interval
+        self.updates: List[Dict[str, Any]] = []
+        self.next_update_id = 1
+        self.new_update = asyncio.Event()
+        # set by the first getUpdates, see bench_startup
+        self.polled = asyncio.Event()
+        self.last_sent: Dict[int, float] = {}
+        self.sent: Counter = Counter()
+        self.flood_errors = 0
+        self.message_id = 0
+
+    def ok(self, result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    async def call(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        if method == "getme":
+            return self.ok(BOT_USER)
+        if method in ("deletewebhook", "setwebhook", "close", "logout"):
+            return self.ok(True)
+        if method == "getupdates":
+            return await self.get_updates(params)
+        if method == "sendmessage":
+            return self.send_message(params)
+        return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"}, status=404)
+
+    async def get_updates(self, params: Dict[str, str]) -> web.Response:
+        self.polled.set()
+        offset = int(params.get("offset", 0))
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates:
+            self.new_update.clear()
+            try:
+                await asyncio.wait_for(self.new_update.wait(), float(params.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                pass
+        return self.ok(self.updates[:int(params.get("limit", 100))])
+
+    def send_message(self, params: Dict[str, str]) -> web.Response:
+        chat_id = int(params["chat_id"])
+        now = time.monotonic()
+        last = self.last_sent.get(chat_id)
+        if last is not None and now - last < self.chat_interval:
+            self.flood_errors += 1
+            retry_after = max(1, round(self.chat_interval - (now - last)))
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+        self.last_sent[chat_id] = now
+        self.sent[chat_id] += 1
+        self.message_id += 1
+        return self.ok({
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        })
+
+    async def inject(self, request: web.Request) -> web.Response:
+        update = await request.json()
+        update.setdefault("update_id", self.next_update_id)
+        self.next_update_id = update["update_id"] + 1
+        self.updates.append(update)
+        self.new_update.set()
+        return self.ok(update["update_id"])
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "messages": sum(self.sent.values()),
+            "chats": len(self.sent),
+            "flood_errors": self.flood_errors,
+        })
+
+def build_app(chat_interval: float = 1.0) -> web.Application:
+    api = FakeBotAPI(chat_interval)
+    app = web.Application()
+    app.router.add_route("*", "/bot{token}/{method}", api.call)
+    app.router.add_post("/inject", api.inject)
+    app.router.add_get("/stats", api.stats)
+    app["api"] = api
+    return app
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--chat-interval", type=float, default=1.0)
+    args = ap.parse_args(argv)
+    web.run_app(build_app(args.chat_interval), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,146 @@
 
 import asyncio
 import logging
+from typing import Optional, Tuple
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
-from .config import BOT_TOKEN
-from .handlers import start as start_handlers
-from .handlers import tutor as tutor_handlers
-from .handlers import misc as misc_handlers
+from . import metrics
+from .config import get_settings
+from .outbox import Outbox
 
 logging.basicConfig(level=logging.INFO)
 
-async def main():
-    bot = Bot(BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+def build_bot() -> Bot:
+    settings = get_settings()
+    session = None
+    if settings.telegram_api_url:
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_url))
+    return Bot(settings.bot_token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+def build_dispatcher(bot: Bot, outbox: Optional[Outbox] = None, metrics_port: Optional[int] = None,
+                     shard: Optional[Tuple[int, int]] = None) -> Dispatcher:
+    # handlers, and through them the engine, are imported here rather than at
+    # the top, so the front of a sharded bot never loads them
+    from .coach import Coach
+    from .concurrency import ConcurrencyMiddleware, SessionLoadMiddleware
+    from .dedup import DedupMiddleware
+    from .engine.classroom import ClassroomRegistry
+    from .engine.practice import ProblemPool
+    from .engine.session import make_store
+    from .engine import symbolic
+    from .events import EventLog
+    from .reminders import ReminderScheduler
+    from .handlers import admin as admin_handlers
+    from .handlers import start as start_handlers
+    from .handlers import teacher as teacher_handlers
+    from .handlers import tutor as tutor_handlers
+    from .handlers import misc as misc_handlers
+
+    settings = get_settings()
     dp = Dispatcher()
+    if outbox is None:
+        outbox = Outbox(bot, settings.outbox_chat_interval, settings.outbox_global_rate)
+    dp["outbox"] = outbox
+    store = make_store(settings.session_store, settings.session_max_count, settings.session_idle_ttl,
+                       settings.session_db)
+    dp["store"] = store
+    dp["classrooms"] = ClassroomRegistry()
+    dp["admin_ids"] = frozenset(int(uid) for uid in settings.admin_ids.replace(",", " ").split())
+    practice = ProblemPool(settings.practice_pool_size)
+    dp["practice"] = practice
+    events = EventLog(settings.events_dir, settings.events_max_buffer)
+    dp["events"] = events
+    # shard = (index, count) when this is one of several worker processes
+    reminders = ReminderScheduler(store, outbox, settings.remind_idle_after, settings.reminders_db, shard,
+                                  settings.reminders_rate)
+    dp["reminders"] = reminders
+    dp["coach"] = Coach(store, events, practice, reminders)
+    metrics.ACTIVE_SESSIONS.set_function(lambda: len(store))
+    # before concurrency, so a duplicate never waits for a slot
+    dp.update.outer_middleware(DedupMiddleware(settings.dedup_window, settings.dedup_max_size))
+    concurrency = ConcurrencyMiddleware(settings.max_in_flight, settings.max_waiting)
+    dp.update.outer_middleware(concurrency)
+    dp["concurrency"] = concurrency
+    dp.message.middleware(metrics.MetricsMiddleware())
+    dp.message.middleware(SessionLoadMiddleware(store))
+    metrics.QUEUE_DEPTH.set_function(lambda: concurrency.stats.waiting)
+    metrics.IN_FLIGHT.set_function(lambda: concurrency.stats.in_flight)
     dp.include_router(start_handlers.router)
+    # before tutor, whose F.text handler would take the commands as answers.
+    # Classes live in one process and span users of every shard
+    dp.include_router(teacher_handlers.router if shard is None else teacher_handlers.off_router)
+    dp.include_router(admin_handlers.router)
     dp.include_router(tutor_handlers.router)
     dp.include_router(misc_handlers.router)
+    dp.startup.register(store.start)
+    dp.shutdown.register(store.stop)
+    dp.startup.register(outbox.start)
+    dp.shutdown.register(outbox.stop)
+    dp.startup.register(practice.start)
+    dp.shutdown.register(practice.stop)
+    dp.startup.register(events.start)
+    dp.startup.register(reminders.start)
+    dp.shutdown.register(reminders.stop)
+    dp.shutdown.register(events.stop)
+    checker = symbolic.configure(settings.symbolic_workers, settings.symbolic_timeout)
+    dp.startup.register(checker.start)
+    dp.shutdown.register(checker.close)
+    if metrics_port is None:
+        metrics_port = settings.metrics_port
+    if metrics_port:
+        metrics.serve(dp, settings.metrics_host, metrics_port)
+    # one process serves the API; sharded workers each hold only some of the sessions
+    if settings.api_port and shard is None:
+        from . import api
+        # web clients can't be messaged out of the blue: no reminders for them
+        api.serve(dp, settings.api_host, settings.api_port, Coach(store, events, practice), settings.api_token)
+    return dp
+
+async def run_polling(bot: Bot, dp: Dispatcher):
     logging.info("Math Coach bot is running (long polling)...")
     await dp.start_polling(bot)
 
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    from aiohttp import web
+    from .webhook import build_app
+
+    settings = get_settings()
+    app = build_app(dp, bot, settings.webhook_path, settings.webhook_secret,
+                    settings.webhook_max_concurrency, settings.webhook_max_pending)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, settings.webhook_host, settings.webhook_port).start()
+    if settings.webhook_url:
+        await bot.set_webhook(
+            settings.webhook_url.rstrip("/") + settings.webhook_path,
+            secret_token=settings.webhook_secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    logging.info("Math Coach bot is running (webhook on %s:%s%s)...",
+                 settings.webhook_host, settings.webhook_port, settings.webhook_path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+async def main():
+    settings = get_settings()
+    bot = build_bot()
+    if settings.workers > 1:
+        from .sharded import build_sharded_dispatcher
+        dp = build_sharded_dispatcher(bot, settings.workers)
+    else:
+        dp = build_dispatcher(bot)
+    if settings.bot_mode == "webhook":
+        await run_webhook(bot, dp)
+    else:
+        await run_polling(bot, dp)
+
 if __name__ == "__main__":
     asyncio.run(main())
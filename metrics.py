@@ -0,0 +1,223 @@
+
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+log = logging.getLogger(__name__)
+
+# A deliberately small Prometheus client: recording is a dict lookup plus an
+# add (or a bisect for histograms), all formatting happens at scrape time.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._child()
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {c.value:g}" for k, c in self._children.items()]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        # evaluated at scrape time only
+        self._function = fn
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {self._function():g}"]
+        return super()._samples()
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                total += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {child.sum:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {total}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    "mathcoach_handler_seconds", "Time spent in a message handler.", ("handler",)))
+API_LATENCY = REGISTRY.register(Histogram(
+    "mathcoach_api_seconds", "Bot API call latency.", ("method",)))
+PROBLEMS_STARTED = REGISTRY.register(Counter(
+    "mathcoach_problems_started_total", "Problems started.", ("skill",)))
+STEP_ATTEMPTS = REGISTRY.register(Counter(
+    "mathcoach_step_attempts_total", "Answers to a step.", ("skill", "checker")))
+STEP_WRONG = REGISTRY.register(Counter(
+    "mathcoach_step_wrong_total", "Answers a step's checker rejected.", ("skill", "checker")))
+HINTS = REGISTRY.register(Counter(
+    "mathcoach_hints_total", "Hints given.", ("skill", "checker")))
+COMPLETIONS = REGISTRY.register(Counter(
+    "mathcoach_completions_total", "Problems solved to the end.", ("skill",)))
+GIVEUPS = REGISTRY.register(Counter(
+    "mathcoach_giveups_total", "/giveup requests.", ("skill",)))
+DUPLICATES = REGISTRY.register(Counter(
+    "mathcoach_duplicate_updates_total", "Redelivered updates dropped by update_id."))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    "mathcoach_active_sessions", "Sessions held by the session store."))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "mathcoach_queued_updates", "Updates waiting for a handler slot or for their user."))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "mathcoach_in_flight_updates", "Updates being handled."))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    "mathcoach_queue_wait_seconds", "Time an update waited for its user and a handler slot."))
+SHED = REGISTRY.register(Counter(
+    "mathcoach_shed_updates_total", "Updates answered with a busy reply because too many were queued."))
+
+# Inner message middleware: handler latency by handler function name.
+class MetricsMiddleware(BaseMiddleware):
+    def __init__(self, histogram: Histogram = HANDLER_LATENCY):
+        self.histogram = histogram
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.histogram.labels(name).observe(time.perf_counter() - started)
+
+async def start_server(host: str, port: int, registry: Registry = REGISTRY):
+    # returns the AppRunner; cleanup() stops it
+    from aiohttp import web
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def serve(dp, host: str, port: int, registry: Registry = REGISTRY) -> None:
+    # runs the endpoint between the dispatcher's startup and shutdown
+    runner = None
+
+    async def start_metrics():
+        nonlocal runner
+        runner = await start_server(host, port, registry)
+        log.info("Metrics on http://%s:%s/metrics", host, port)
+
+    async def stop_metrics():
+        if runner is not None:
+            await runner.cleanup()
+
+    dp.startup.register(start_metrics)
+    dp.shutdown.register(stop_metrics)
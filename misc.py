@@ -1,11 +1,14 @@
 
 from aiogram import Router
-from aiogram.types import Message
+from aiogram.types import ErrorEvent
+
+from ..outbox import Outbox
 
 router = Router(name=__name__)
 
 @router.errors()
-async def on_error(update, exception):
-    if isinstance(update, Message):
-        await update.answer("Упс, что-то пошло не так. Попробуй ещё раз или начни заново командой /new.")
+async def on_error(event: ErrorEvent, outbox: Outbox):
+    message = event.update.message
+    if message is not None:
+        outbox.send(message.chat.id, "Упс, что-то пошло не так. Попробуй ещё раз или начни заново командой /new.")
     return True
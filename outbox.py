@@ -0,0 +1,189 @@
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+
+from .metrics import API_LATENCY
+
+MAX_MESSAGE_LENGTH = 4096
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class OutboxStats:
+    queued: int = 0
+    sent: int = 0
+    # texts that went out inside another text's message
+    coalesced: int = 0
+    retry_after: int = 0
+    failed: int = 0
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    # pieces of at most `limit` characters, cut at a line break or else a space
+    # where there is one
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            parts.append(text[:limit])
+            text = text[limit:]
+        else:
+            parts.append(text[:cut])
+            text = text[cut + 1:]
+    parts.append(text)
+    return parts
+
+def coalesce(texts: List[str], limit: int = MAX_MESSAGE_LENGTH, sep: str = "\n\n") -> Tuple[str, List[str]]:
+    # joins as many leading texts as fit into one message; returns it and the
+    # rest. Outbox.send() has already split texts longer than `limit`.
+    message = texts[0]
+    used = 1
+    for text in texts[1:]:
+        if len(message) + len(sep) + len(text) > limit:
+            break
+        message += sep + text
+        used += 1
+    return message, texts[used:]
+
+# Handlers put replies here instead of awaiting bot.send_message. Replies to
+# the same chat that are still waiting get merged into one message, each chat
+# gets at most one message per `chat_interval` seconds and the whole bot at
+# most `global_rate` per second. RetryAfter pauses sending for the time
+# Telegram asks for and the message is retried, so a flood limit never fails
+# the handler that produced the reply.
+class Outbox:
+    def __init__(self, bot: Bot, chat_interval: float = 1.0, global_rate: float = 25.0,
+                 workers: int = 8, max_retries: int = 5):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.global_rate = global_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        self.stats = OutboxStats()
+        self._pending: Dict[int, List[str]] = {}
+        self._ready: Deque[int] = deque()
+        self._delayed: List[Tuple[float, int]] = []
+        self._busy: Set[int] = set()
+        self._cooldown: Dict[int, float] = {}
+        self._global_next = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._last_purge = 0.0
+
+    def send(self, chat_id: int, *texts: str) -> None:
+        # too long for one message: several, nothing is cut off
+        texts = [piece for t in texts if t for piece in split_text(t)]
+        if not texts:
+            return
+        self.stats.queued += len(texts)
+        buf = self._pending.get(chat_id)
+        if buf is not None:
+            buf.extend(texts)
+            return
+        self._pending[chat_id] = texts
+        if chat_id not in self._busy:
+            self._schedule(chat_id)
+
+    def _schedule(self, chat_id: int) -> None:
+        due = self._cooldown.get(chat_id, 0.0)
+        if due <= time.monotonic():
+            self._ready.append(chat_id)
+        else:
+            heapq.heappush(self._delayed, (due, chat_id))
+        if self._wake is not None:
+            self._wake.set()
+
+    def _purge_cooldowns(self, now: float) -> None:
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        self._cooldown = {c: t for c, t in self._cooldown.items() if t > now}
+
+    async def _next_chat(self) -> int:
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._ready.append(heapq.heappop(self._delayed)[1])
+            if self._ready:
+                return self._ready.popleft()
+            self._purge_cooldowns(now)
+            self._wake.clear()
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _global_slot(self) -> None:
+        now = time.monotonic()
+        at = max(now, self._global_next)
+        self._global_next = at + 1 / self.global_rate
+        if at > now:
+            await asyncio.sleep(at - now)
+
+    async def _send_one(self, chat_id: int, text: str) -> None:
+        latency = API_LATENCY.labels("sendMessage")
+        for attempt in range(self.max_retries):
+            await self._global_slot()
+            started = time.perf_counter()
+            try:
+                await self.bot.send_message(chat_id, text)
+                self.stats.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                # can't tell a chat limit from a global one, so pause everything
+                self.stats.retry_after += 1
+                self._global_next = max(self._global_next, time.monotonic() + e.retry_after)
+            except TelegramNetworkError:
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except TelegramAPIError as e:
+                log.warning("Dropping message to chat %s: %s", chat_id, e)
+                break
+            finally:
+                latency.observe(time.perf_counter() - started)
+        self.stats.failed += 1
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._next_chat()
+            texts = self._pending.pop(chat_id, None)
+            if not texts:
+                continue
+            message, rest = coalesce(texts)
+            self.stats.coalesced += len(texts) - len(rest) - 1
+            if rest:
+                self._pending[chat_id] = rest + self._pending.get(chat_id, [])
+            self._busy.add(chat_id)
+            try:
+                await self._send_one(chat_id, message)
+            finally:
+                self._busy.discard(chat_id)
+                self._cooldown[chat_id] = time.monotonic() + self.chat_interval
+                if chat_id in self._pending:
+                    self._schedule(chat_id)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self._pending:
+            self._wake.set()
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        deadline = time.monotonic() + drain_timeout
+        while (self._pending or self._busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,184 @@
+
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+DIFFICULTIES = (1, 2, 3)
+
+# skill id -> (name shown to the student, prefixes a /practice topic may start
+# with; the first one is what the bot suggests)
+TOPICS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "linear_eq": ("линейные уравнения", ("линейные", "линейн", "linear")),
+    "frac_add": ("сложение дробей", ("дроби", "дроб", "frac")),
+    "quadratic_eq": ("квадратные уравнения", ("квадратные", "квадрат", "quadratic")),
+    "proportion": ("пропорции", ("пропорции", "пропорц", "proportion")),
+}
+
+def find_topic(text: str) -> Optional[str]:
+    word = text.strip().lower()
+    if not word:
+        return None
+    for skill_id, (_, prefixes) in TOPICS.items():
+        if word == skill_id or any(word.startswith(p) for p in prefixes):
+            return skill_id
+    return None
+
+# Generators draw whole batches with NumPy and build each problem backwards
+# from its answer, so every one has integer roots, an integer x or a bounded
+# common denominator. They return problem texts in the form the skills parse.
+
+def _nonzero(rng, low: int, high: int, n: int):
+    import numpy as np
+
+    values = np.arange(low, high + 1)
+    return rng.choice(values[values != 0], n)
+
+def _term(coef: int, var: str) -> str:
+    # leading term: "3x", "x", "-x"
+    if coef == 1:
+        return var
+    if coef == -1:
+        return "-" + var
+    return f"{coef}{var}"
+
+def _signed(coef: int, var: str = "") -> str:
+    # following term: " + 3x", " - x", "" for 0
+    if coef == 0:
+        return ""
+    sign = " + " if coef > 0 else " - "
+    coef = abs(coef)
+    return sign + (var if coef == 1 and var else f"{coef}{var}")
+
+# per difficulty: (|a| max, x range, |b| max)
+_LINEAR = {1: (5, (1, 10), 20), 2: (9, (-10, 10), 30), 3: (15, (-25, 25), 60)}
+
+def _linear(rng, difficulty: int, n: int) -> List[str]:
+    a_max, (x_lo, x_hi), b_max = _LINEAR[difficulty]
+    a = rng.integers(2, a_max + 1, n) if difficulty == 1 else _nonzero(rng, -a_max, a_max, n)
+    x = rng.integers(x_lo, x_hi + 1, n)
+    b = rng.integers(1, b_max + 1, n) if difficulty == 1 else _nonzero(rng, -b_max, b_max, n)
+    c = a * x + b
+    return [f"Реши: {_term(a_, 'x')}{_signed(b_)} = {c_}"
+            for a_, b_, c_ in zip(a.tolist(), b.tolist(), c.tolist())]
+
+# per difficulty: (largest denominator, largest common denominator)
+_FRAC = {1: (6, 12), 2: (12, 36), 3: (20, 120)}
+
+def _frac_add(rng, difficulty: int, n: int) -> List[str]:
+    import numpy as np
+
+    d_max, lcd_max = _FRAC[difficulty]
+    out: List[str] = []
+    while len(out) < n:
+        # oversample, then keep the pairs whose common denominator is small enough
+        m = 2 * (n - len(out))
+        d1, d2 = rng.integers(2, d_max + 1, m), rng.integers(2, d_max + 1, m)
+        n1 = (rng.random(m) * (d1 - 1)).astype(np.int64) + 1
+        n2 = (rng.random(m) * (d2 - 1)).astype(np.int64) + 1
+        keep = np.lcm(d1, d2) <= lcd_max
+        if difficulty > 1:
+            keep &= d1 != d2
+        out.extend(f"Сложи дроби: {a}/{b} + {c}/{d}"
+                   for a, b, c, d in zip(n1[keep].tolist(), d1[keep].tolist(),
+                                         n2[keep].tolist(), d2[keep].tolist()))
+    return out[:n]
+
+# per difficulty: (leading coefficients, root range)
+_QUADRATIC = {1: ((1,), 6), 2: ((1,), 12), 3: ((1, 2, 3, -1, -2), 10)}
+
+def _quadratic(rng, difficulty: int, n: int) -> List[str]:
+    leading, r_max = _QUADRATIC[difficulty]
+    a = rng.choice(leading, n)
+    r1 = rng.integers(-r_max, r_max + 1, n)
+    # a different second root: shift by 1..2·r_max and wrap into the range
+    r2 = (r1 + r_max + rng.integers(1, 2 * r_max + 1, n)) % (2 * r_max + 1) - r_max
+    b, c = -a * (r1 + r2), a * r1 * r2
+    return [f"Реши: {_term(a_, 'x^2')}{_signed(b_, 'x')}{_signed(c_)} = 0"
+            for a_, b_, c_ in zip(a.tolist(), b.tolist(), c.tolist())]
+
+# per difficulty: (factor range, positions the unknown may take)
+_PROPORTION = {1: (4, (3,)), 2: (6, (2, 3)), 3: (9, (0, 1, 2, 3))}
+
+def _proportion(rng, difficulty: int, n: int) -> List[str]:
+    import numpy as np
+
+    f_max, positions = _PROPORTION[difficulty]
+    # a:b = c:d with a = u·v, b = u·w, c = v·z, d = w·z, so a·d = b·c holds
+    # and whichever term is hidden comes out a whole number
+    u, v, w, z = rng.integers(1, f_max + 1, (4, n))
+    terms = np.stack([u * v, u * w, v * z, w * z], axis=1).astype(str)
+    terms[np.arange(n), rng.choice(positions, n)] = "x"
+    return [f"Найди x: {t0}:{t1} = {t2}:{t3}" for t0, t1, t2, t3 in terms.tolist()]
+
+GENERATORS: Dict[str, Callable[..., List[str]]] = {
+    "linear_eq": _linear,
+    "frac_add": _frac_add,
+    "quadratic_eq": _quadratic,
+    "proportion": _proportion,
+}
+
+def generate(skill_id: str, difficulty: int, n: int, seed: Optional[int] = None) -> List[str]:
+    import numpy as np
+
+    return GENERATORS[skill_id](np.random.default_rng(seed), difficulty, n)
+
+# Ready problems per (skill, difficulty). take() is a pop from a deque; when a
+# pool falls below `low_water` a refill of `size` problems is generated in a
+# thread, off the event loop. start() fills all pools in the background, so
+# the bot polls meanwhile; a request only generates problems itself if it
+# comes before that is done or refills can't keep up.
+class ProblemPool:
+    def __init__(self, size: int = 200, low_water: Optional[int] = None):
+        self.size = size
+        self.low_water = size // 4 if low_water is None else low_water
+        self._pools: Dict[Tuple[str, int], Deque[str]] = {
+            (skill_id, d): deque() for skill_id in GENERATORS for d in DIFFICULTIES}
+        self._refilling: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._filling: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(p) for p in self._pools.values())
+
+    def take(self, skill_id: str, difficulty: int = 1) -> str:
+        key = (skill_id, difficulty)
+        pool = self._pools[key]
+        if not pool:
+            log.warning("Practice pool %s empty, generating on request", key)
+            pool.extend(generate(skill_id, difficulty, self.size))
+        text = pool.popleft()
+        if len(pool) < self.low_water and key not in self._refilling:
+            self._refilling[key] = asyncio.get_running_loop().create_task(self._refill(key))
+        return text
+
+    async def _refill(self, key: Tuple[str, int]) -> None:
+        try:
+            texts = await asyncio.get_running_loop().run_in_executor(None, generate, *key, self.size)
+            self._pools[key].extend(texts)
+        except Exception:
+            log.exception("Failed to refill practice pool %s", key)
+        finally:
+            del self._refilling[key]
+
+    async def _fill_all(self) -> None:
+        loop = asyncio.get_running_loop()
+        for key, pool in self._pools.items():
+            try:
+                texts = await loop.run_in_executor(None, generate, *key, self.size)
+            except Exception:
+                log.exception("Failed to fill practice pool %s", key)
+                continue
+            # take() may have filled it on request meanwhile
+            pool.extend(texts[:max(0, self.size - len(pool))])
+
+    async def start(self) -> None:
+        if self._filling is None:
+            self._filling = asyncio.create_task(self._fill_all())
+
+    async def stop(self) -> None:
+        if self._filling is not None:
+            self._filling.cancel()
+        for task in list(self._refilling.values()):
+            task.cancel()
@@ -0,0 +1,298 @@
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import lru_cache
+from math import gcd, isqrt, sqrt
+from typing import Dict, Optional, Tuple, Union
+
+from .classify import unify_symbols
+from .utils import MAX_DIGITS, safe_powers
+
+# Canonical structure of a problem, extracted once per distinct problem text.
+# Values are exact Fractions; the skills check students' answers against them.
+
+@dataclass(frozen=True, slots=True)
+class LinearProblem:
+    # a·x + b = c, with b and c kept on the sides where they were written
+    a: Fraction
+    b: Fraction
+    c: Fraction
+
+@dataclass(frozen=True, slots=True)
+class FracSumProblem:
+    # n1/d1 + n2/d2
+    n1: int
+    d1: int
+    n2: int
+    d2: int
+
+@dataclass(frozen=True, slots=True)
+class QuadraticProblem:
+    # a·x^2 + b·x + c = 0
+    a: Fraction
+    b: Fraction
+    c: Fraction
+
+@dataclass(frozen=True, slots=True)
+class ProportionProblem:
+    # terms[0]:terms[1] = terms[2]:terms[3], the unknown is None
+    terms: Tuple[Optional[Fraction], Optional[Fraction], Optional[Fraction], Optional[Fraction]]
+
+    @property
+    def unknown(self) -> int:
+        return self.terms.index(None)
+
+Problem = Union[LinearProblem, FracSumProblem, QuadraticProblem, ProportionProblem]
+
+# Solution traces: every value a student is asked for, computed once from the
+# parsed problem so that checking an answer is a single comparison.
+
+@dataclass(frozen=True, slots=True)
+class LinearTrace:
+    ax: Fraction  # c - b
+    x: Fraction
+
+@dataclass(frozen=True, slots=True)
+class FracSumTrace:
+    lcd: int
+    # numerators after bringing both fractions to lcd
+    m1: int
+    m2: int
+    sum_num: int
+    result: Fraction
+
+@dataclass(frozen=True, slots=True)
+class QuadraticTrace:
+    D: Fraction
+    # ascending; Fractions when D is a square of a rational, floats otherwise
+    roots: Tuple[Union[Fraction, float], ...]
+
+@dataclass(frozen=True, slots=True)
+class ProportionTrace:
+    x: Fraction
+
+Trace = Union[LinearTrace, FracSumTrace, QuadraticTrace, ProportionTrace]
+
+# "Реши: ", "Найди x: " etc. - a label ending in a word followed by ": "
+_LABEL = re.compile(r"^.*[a-zа-яё]:\s+", re.S)
+_MATH_RUN = re.compile(r"[0-9x.+\-*/^:=() ]+")
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+_TERM = re.compile(r"([+-]?)(\d+(?:\.\d+)?)?(\*?x(?:\^2)?)?")
+_NUM = r"(\d+(?:\.\d+)?|x)"
+_FRAC_SUM = re.compile(r"^(-?\d+)/(\d+)\+(-?\d+)/(\d+)=?$")
+_PROPORTION = re.compile(rf"^{_NUM}[:/]{_NUM}={_NUM}[:/]{_NUM}$")
+MAX_SYMPY_INPUT = 120
+# a number too long for float(), which hints and irrational roots go through
+_LONG_NUMBER = re.compile(rf"\d{{{MAX_DIGITS + 1}}}")
+
+def extract_expression(problem_text: str) -> str:
+    # the math part of a free-form problem, without spaces and with x and ^
+    text = unify_symbols(_DECIMAL_COMMA.sub(".", problem_text))
+    m = _LABEL.match(text)
+    if m and re.search(r"[=+]", text[m.end():]):
+        text = text[m.end():]
+    expr = max(_MATH_RUN.findall(text), key=len, default="")
+    return "".join(expr.split()).replace("**", "^").strip(":=+*/^.")
+
+def _polynomial(side: str) -> Optional[Dict[int, Fraction]]:
+    # sum of terms like 3x^2, -x, 2.5*x, 7; None if the side is anything else
+    if not side:
+        return None
+    coefs = {0: Fraction(0), 1: Fraction(0), 2: Fraction(0)}
+    pos = 0
+    while pos < len(side):
+        m = _TERM.match(side, pos)
+        sign, num, var = m.groups()
+        if m.end() == pos or (num is None and var is None) or (pos > 0 and not sign):
+            return None
+        value = Fraction(num) if num is not None else Fraction(1)
+        if sign == "-":
+            value = -value
+        coefs[2 if var and var.endswith("^2") else 1 if var else 0] += value
+        pos = m.end()
+    return coefs
+
+def sympy_polynomial(side: str) -> Optional[Dict[int, Fraction]]:
+    # slow path for parentheses, division etc.; sympy is imported only here.
+    # The side only contains characters from _MATH_RUN, so parse_expr can't
+    # reach any name besides x. The bot runs it in the symbolic process pool
+    # (see Skill.prepare), tools call it right here through _sympy_polynomial.
+    if len(side) > MAX_SYMPY_INPUT or not safe_powers(side):
+        return None
+    try:
+        import sympy
+        from sympy.parsing.sympy_parser import (
+            parse_expr, standard_transformations, implicit_multiplication_application, convert_xor)
+    except ImportError:
+        return None
+    x = sympy.Symbol("x")
+    try:
+        expr = parse_expr(side, local_dict={"x": x},
+                          transformations=standard_transformations + (implicit_multiplication_application, convert_xor))
+        poly = sympy.Poly(sympy.nsimplify(sympy.expand(expr), rational=True), x)
+    except Exception:
+        return None
+    if poly.degree() > 2:
+        return None
+    coefs = {0: Fraction(0), 1: Fraction(0), 2: Fraction(0)}
+    for (power,), coef in poly.terms():
+        coefs[power] = Fraction(int(coef.p), int(coef.q))
+    return coefs
+
+# sympy_polynomial() results by side, None included
+_slow: "OrderedDict[str, Optional[Dict[int, Fraction]]]" = OrderedDict()
+MAX_SLOW_CACHE = 4096
+
+def remember_polynomial(side: str, coefs: Optional[Dict[int, Fraction]]) -> None:
+    _slow[side] = coefs
+    if len(_slow) > MAX_SLOW_CACHE:
+        _slow.popitem(last=False)
+
+def _sympy_polynomial(side: str) -> Optional[Dict[int, Fraction]]:
+    if side in _slow:
+        _slow.move_to_end(side)
+        return _slow[side]
+    coefs = sympy_polynomial(side)
+    remember_polynomial(side, coefs)
+    return coefs
+
+def slow_sides(skill_id: str, problem_text: str) -> Tuple[str, ...]:
+    # sides of the problem's equation that only sympy_polynomial() can read
+    # and that it hasn't read yet
+    if skill_id not in ("linear_eq", "quadratic_eq"):
+        return ()
+    expr = extract_expression(problem_text)
+    if expr.count("=") != 1 or _LONG_NUMBER.search(expr):
+        return ()
+    return tuple(side for side in expr.split("=") if side and _polynomial(side) is None and side not in _slow)
+
+def _sides(expr: str) -> Optional[Tuple[Dict[int, Fraction], Dict[int, Fraction]]]:
+    if expr.count("=") != 1:
+        return None
+    left, right = expr.split("=")
+    sides = []
+    for side in (left, right):
+        poly = _polynomial(side)
+        if poly is None:
+            poly = _sympy_polynomial(side)
+        if poly is None:
+            return None
+        sides.append(poly)
+    return sides[0], sides[1]
+
+def _parse_linear(expr: str) -> Optional[LinearProblem]:
+    sides = _sides(expr)
+    if sides is None:
+        return None
+    left, right = sides
+    if left[2] or right[2]:
+        return None
+    if not left[1] and right[1]:
+        left, right = right, left
+    a = left[1] - right[1]
+    if not a:
+        return None
+    return LinearProblem(a, left[0], right[0])
+
+def _parse_quadratic(expr: str) -> Optional[QuadraticProblem]:
+    sides = _sides(expr)
+    if sides is None:
+        return None
+    left, right = sides
+    a, b, c = (left[k] - right[k] for k in (2, 1, 0))
+    if not a:
+        return None
+    return QuadraticProblem(a, b, c)
+
+def _parse_frac_sum(expr: str) -> Optional[FracSumProblem]:
+    m = _FRAC_SUM.match(expr)
+    if not m:
+        return None
+    n1, d1, n2, d2 = map(int, m.groups())
+    if not d1 or not d2:
+        return None
+    return FracSumProblem(n1, d1, n2, d2)
+
+def _parse_proportion(expr: str) -> Optional[ProportionProblem]:
+    m = _PROPORTION.match(expr)
+    if not m or m.groups().count("x") != 1:
+        return None
+    terms = tuple(None if t == "x" else Fraction(t) for t in m.groups())
+    if any(t == 0 for t in terms):
+        return None
+    return ProportionProblem(terms)
+
+def _solve_linear(p: LinearProblem) -> LinearTrace:
+    ax = p.c - p.b
+    return LinearTrace(ax, ax / p.a)
+
+def _solve_frac_sum(p: FracSumProblem) -> FracSumTrace:
+    lcd = p.d1 * p.d2 // gcd(p.d1, p.d2)
+    m1, m2 = p.n1 * (lcd // p.d1), p.n2 * (lcd // p.d2)
+    return FracSumTrace(lcd, m1, m2, m1 + m2, Fraction(m1 + m2, lcd))
+
+def _rational_sqrt(value: Fraction) -> Optional[Fraction]:
+    num, den = isqrt(value.numerator), isqrt(value.denominator)
+    if num * num == value.numerator and den * den == value.denominator:
+        return Fraction(num, den)
+    return None
+
+def _solve_quadratic(p: QuadraticProblem) -> QuadraticTrace:
+    D = p.b * p.b - 4 * p.a * p.c
+    if D < 0:
+        return QuadraticTrace(D, ())
+    if D == 0:
+        return QuadraticTrace(D, (-p.b / (2 * p.a),))
+    root = _rational_sqrt(D)
+    if root is not None:
+        roots = ((-p.b - root) / (2 * p.a), (-p.b + root) / (2 * p.a))
+    else:
+        roots = ((-float(p.b) - sqrt(D)) / float(2 * p.a), (-float(p.b) + sqrt(D)) / float(2 * p.a))
+    return QuadraticTrace(D, tuple(sorted(roots)))
+
+def _solve_proportion(p: ProportionProblem) -> ProportionTrace:
+    # product of the extremes equals product of the means
+    t = p.terms
+    i = p.unknown
+    if i in (0, 3):
+        return ProportionTrace(t[1] * t[2] / t[3 - i])
+    return ProportionTrace(t[0] * t[3] / t[3 - i])
+
+_PARSERS = {
+    "linear_eq": _parse_linear,
+    "frac_add": _parse_frac_sum,
+    "quadratic_eq": _parse_quadratic,
+    "proportion": _parse_proportion,
+}
+
+_SOLVERS = {
+    "linear_eq": _solve_linear,
+    "frac_add": _solve_frac_sum,
+    "quadratic_eq": _solve_quadratic,
+    "proportion": _solve_proportion,
+}
+
+@lru_cache(maxsize=4096)
+def _parse(skill_id: str, expr: str) -> Optional[Problem]:
+    parser = _PARSERS.get(skill_id)
+    if parser is None or _LONG_NUMBER.search(expr):
+        return None
+    return parser(expr)
+
+def parse_problem(skill_id: str, problem_text: str) -> Optional[Problem]:
+    # None when the text is not in a form the skill understands; the skill
+    # then falls back to checking answers for consistency only
+    return _parse(skill_id, extract_expression(problem_text))
+
+@lru_cache(maxsize=4096)
+def _solve(skill_id: str, expr: str) -> Optional[Trace]:
+    problem = _parse(skill_id, expr)
+    solver = _SOLVERS.get(skill_id)
+    return solver(problem) if problem is not None and solver else None
+
+def solve_problem(skill_id: str, problem_text: str) -> Optional[Trace]:
+    # keyed by the extracted expression, so a problem a whole class got in
+    # slightly different spelling is still solved once per process
+    return _solve(skill_id, extract_expression(problem_text))
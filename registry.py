@@ -0,0 +1,69 @@
+
+import logging
+from typing import Any, Callable, Dict, Iterator, Mapping, TypeVar
+
+ENTRY_POINT_GROUP = "mathcoach.skills"
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def checker(checker_id: str) -> Callable[[T], T]:
+    # marks a Skill method as the checker for steps with this answer_checker id
+    def mark(fn: T) -> T:
+        fn.checker_id = checker_id
+        return fn
+    return mark
+
+# Skill id -> Skill instance. Built-in skills register with the @register
+# class decorator; third-party packages expose Skill classes (or instances)
+# under the "mathcoach.skills" entry point group, and those are imported the
+# first time a lookup misses or the registry is iterated.
+class SkillRegistry(Mapping[str, Any]):
+    def __init__(self, group: str = ENTRY_POINT_GROUP):
+        self.group = group
+        # bumped on every registration so derived data (the classifier) can
+        # tell it is stale
+        self.version = 0
+        self._skills: Dict[str, Any] = {}
+        self._entry_points_loaded = False
+
+    def register(self, skill_cls: T) -> T:
+        self.add(skill_cls())
+        return skill_cls
+
+    def add(self, skill: Any) -> None:
+        self._skills[skill.id] = skill
+        self.version += 1
+
+    def _load_entry_points(self) -> None:
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        # importlib.metadata is slow to import; only pay for it on first use
+        from importlib.metadata import entry_points
+
+        for ep in entry_points(group=self.group):
+            try:
+                obj = ep.load()
+            except Exception:
+                log.exception("Failed to load skill entry point %s", ep.name)
+                continue
+            self.add(obj() if isinstance(obj, type) else obj)
+
+    def __getitem__(self, skill_id: str) -> Any:
+        try:
+            return self._skills[skill_id]
+        except KeyError:
+            if self._entry_points_loaded:
+                raise
+        self._load_entry_points()
+        return self._skills[skill_id]
+
+    def __iter__(self) -> Iterator[str]:
+        self._load_entry_points()
+        return iter(self._skills)
+
+    def __len__(self) -> int:
+        self._load_entry_points()
+        return len(self._skills)
@@ -0,0 +1,232 @@
+
+import asyncio
+import heapq
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .engine.practice import TOPICS
+from .engine.session import SessionStore
+from .outbox import Outbox
+
+log = logging.getLogger(__name__)
+
+IDLE = "idle"
+REVIEW = "review:"
+DAY = 86400.0
+# days until the next review of a skill, by how many reviews went well
+REVIEW_INTERVALS = (1, 3, 7, 21)
+# wrong answers plus hints in one problem that call for a review
+STRUGGLE_MISTAKES = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    user_id INTEGER NOT NULL,
+    kind    TEXT    NOT NULL,
+    due     REAL    NOT NULL,
+    level   INTEGER NOT NULL,
+    PRIMARY KEY (user_id, kind)
+);
+"""
+
+UPSERT = ("INSERT INTO reminders(user_id, kind, due, level) VALUES (?, ?, ?, ?) "
+          "ON CONFLICT(user_id, kind) DO UPDATE SET due = excluded.due, level = excluded.level")
+
+@dataclass
+class ReminderStats:
+    scheduled: int = 0
+    sent: int = 0
+    # idle reminders for sessions that were finished or gone by then
+    skipped: int = 0
+    # ticks that left due reminders for later because of `rate`
+    late_ticks: int = 0
+
+# Pending reminders per (user, kind): an idle nudge a while after the last
+# answer, and a review of each skill the student struggled with, spaced by
+# REVIEW_INTERVALS as reviews go well. One heap of (due, user, kind) holds
+# them all; rescheduling pushes a new entry and the old one is skipped when
+# popped (it no longer matches `_entries`), and the heap is rebuilt when
+# such dead entries pile up. A single task wakes every `tick` seconds and
+# sends at most `rate` reminders a second through the outbox, so a backlog
+# (say, after a restart) is spread out instead of crowding out replies.
+# With `path`, reminders are kept in SQLite, written in batches from a
+# dedicated thread like SQLiteStore; `shard` = (index, count) loads only the
+# users of one shard.
+class ReminderScheduler:
+    def __init__(self, store: SessionStore, outbox: Outbox, idle_after: float = 1800.0,
+                 path: str = "", shard: Optional[Tuple[int, int]] = None, rate: float = 5.0,
+                 tick: float = 1.0, flush_interval: float = 1.0):
+        self.store = store
+        self.outbox = outbox
+        self.idle_after = idle_after
+        self.path = path
+        self.shard = shard
+        self.rate = rate
+        self.tick = tick
+        self.flush_interval = flush_interval
+        self.stats = ReminderStats()
+        # (user_id, kind) -> (due, level)
+        self._entries: Dict[Tuple[int, str], Tuple[float, int]] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        # (user_id, kind) -> (due, level) to write, None means delete
+        self._dirty: Dict[Tuple[int, str], Optional[Tuple[float, int]]] = {}
+        self._budget = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_flush = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, user_id: int, kind: str, due: float, level: int = 0) -> None:
+        key = (user_id, kind)
+        self._entries[key] = (due, level)
+        heapq.heappush(self._heap, (due, user_id, kind))
+        self.stats.scheduled += 1
+        if self.path:
+            self._dirty[key] = (due, level)
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._compact()
+
+    def cancel(self, user_id: int, kind: str) -> None:
+        if self._entries.pop((user_id, kind), None) is not None and self.path:
+            self._dirty[(user_id, kind)] = None
+
+    def _compact(self) -> None:
+        self._heap = [(due, uid, kind) for (uid, kind), (due, _) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def active(self, user_id: int) -> None:
+        # the student answered or asked for a hint: nudge them if they stop here
+        if self.idle_after > 0:
+            self.schedule(user_id, IDLE, time.time() + self.idle_after)
+
+    def finished(self, user_id: int, skill_id: str, mistakes: int) -> None:
+        self.cancel(user_id, IDLE)
+        if skill_id not in TOPICS:
+            return
+        kind = REVIEW + skill_id
+        pending = self._entries.get((user_id, kind))
+        if mistakes >= STRUGGLE_MISTAKES:
+            level = 0
+        elif pending is not None:
+            # solved cleanly while a review is pending: space the next one out
+            level = pending[1] + 1
+            if level >= len(REVIEW_INTERVALS):
+                return self.cancel(user_id, kind)
+        else:
+            return
+        self.schedule(user_id, kind, time.time() + REVIEW_INTERVALS[level] * DAY, level)
+
+    async def _message(self, user_id: int, kind: str) -> Optional[str]:
+        if kind == IDLE:
+            # fetch, not get: a reminder must not keep an idle session alive,
+            # and after a restart the session may only be on disk
+            state = await self.store.fetch(user_id)
+            if state is None or state.finished:
+                return None
+            return (f"Ты остановился(ась) на шаге {state.step_index + 1}/{len(state.steps)} задачи:\n"
+                    f"{state.problem_text}\n\nПродолжим? Ответь на шаг или попроси /hint.")
+        name, prefixes = TOPICS[kind[len(REVIEW):]]
+        return f"Пора повторить {name}: /practice {prefixes[0]}"
+
+    async def fire_due(self, now: float, limit: int) -> int:
+        heap, sent = self._heap, 0
+        while heap and heap[0][0] <= now and sent < limit:
+            due, user_id, kind = heapq.heappop(heap)
+            entry = self._entries.get((user_id, kind))
+            if entry is None or entry[0] != due:
+                continue
+            if kind == IDLE:
+                # fires once; the next answer schedules a new one
+                self.cancel(user_id, IDLE)
+            else:
+                # repeats at its spacing until the student practices the skill
+                self.schedule(user_id, kind, now + REVIEW_INTERVALS[entry[1]] * DAY, entry[1])
+            text = await self._message(user_id, kind)
+            if text is None:
+                self.stats.skipped += 1
+                continue
+            # private chats: chat id is the user id
+            self.outbox.send(user_id, text)
+            self.stats.sent += 1
+            sent += 1
+        if heap and heap[0][0] <= now:
+            self.stats.late_ticks += 1
+        return sent
+
+    def _open(self) -> List[Tuple[int, str, float, int]]:
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        query, args = "SELECT user_id, kind, due, level FROM reminders", ()
+        if self.shard is not None:
+            query += " WHERE user_id % ? = ?"
+            args = (self.shard[1], self.shard[0])
+        return self._db.execute(query, args).fetchall()
+
+    def _write(self, upserts: List[Tuple[int, str, float, int]], deletes: List[Tuple[int, str]]) -> None:
+        db = self._db
+        db.execute("BEGIN")
+        try:
+            db.executemany(UPSERT, upserts)
+            db.executemany("DELETE FROM reminders WHERE user_id = ? AND kind = ?", deletes)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    async def flush(self) -> None:
+        if not self._dirty or self._db is None:
+            return
+        batch, self._dirty = self._dirty, {}
+        upserts = [(uid, kind, *v) for (uid, kind), v in batch.items() if v is not None]
+        deletes = [key for key, v in batch.items() if v is None]
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, upserts, deletes)
+        except Exception:
+            log.exception("Failed to save %d reminders, will retry", len(batch))
+            self._dirty = {**batch, **self._dirty}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            # unused budget doesn't pile up beyond one tick
+            self._budget = min(self._budget + self.rate * self.tick, max(1.0, self.rate * self.tick))
+            sent = await self.fire_due(time.time(), int(self._budget))
+            self._budget -= sent
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._last_flush = now
+                await self.flush()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        if self.path:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reminders")
+            rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+            for user_id, kind, due, level in rows:
+                self._entries[(user_id, kind)] = (due, level)
+            self._compact()
+            log.info("Loaded %d reminders", len(rows))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._db is not None:
+            await self.flush()
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._db.close)
+            self._db = None
+            self._executor.shutdown(wait=True)
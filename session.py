@@ -1,32 +1,196 @@
 
-from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple, Callable, Union, TYPE_CHECKING
 
-@dataclass
+if TYPE_CHECKING:
+    from .sqlite_store import SQLiteStore
+
+# Steps are defined once per skill and shared by every session of that skill.
+@dataclass(frozen=True, slots=True)
 class Step:
     prompt: str
-    hint_levels: List[str] = field(default_factory=list)
+    hint_levels: Tuple[str, ...] = ()
     answer_checker: str = ""
-    meta: Dict[str, Any] = field(default_factory=dict)
 
-@dataclass
+@dataclass(slots=True)
 class TutorState:
     skill_id: str
     problem_text: str
     step_index: int = 0
-    steps: List[Step] = field(default_factory=list)
-    scratch: Dict[str, Any] = field(default_factory=dict)
+    steps: Tuple[Step, ...] = ()
+    hints_used: int = 0
+    # wrong answers and hints over the whole problem
+    mistakes: int = 0
+    # per-skill slots dataclass (see Skill.scratch_type), None until a step
+    # keeps a value in it
+    scratch: Any = None
     finished: bool = False
+    # parsed problem and its solution trace (see problem.parse_problem and
+    # problem.solve_problem), both shared between sessions
+    problem: Any = None
+    trace: Any = None
+    # classroom.Assignment the session belongs to, told about every step taken
+    assignment: Any = None
+
+@dataclass
+class StoreStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
 
 class MemoryStore:
     def __init__(self):
         self._data: Dict[int, TutorState] = {}
 
+    def __len__(self) -> int:
+        return len(self._data)
+
     def get(self, user_id: int) -> Optional[TutorState]:
         return self._data.get(user_id)
 
+    def peek(self, user_id: int) -> Optional[TutorState]:
+        # get() that doesn't count as activity (see LRUStore.peek)
+        return self._data.get(user_id)
+
+    async def fetch(self, user_id: int) -> Optional[TutorState]:
+        # peek() that may read from disk, see SQLiteStore.fetch
+        return self._data.get(user_id)
+
     def set(self, user_id: int, state: TutorState) -> None:
         self._data[user_id] = state
 
     def clear(self, user_id: int) -> None:
         self._data.pop(user_id, None)
+
+    async def load(self, user_id: int) -> None:
+        # everything is in memory already; see SQLiteStore.load
+        pass
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+class _Entry:
+    __slots__ = ("touched", "state")
+
+    def __init__(self, touched: float, state: TutorState):
+        self.touched = touched
+        self.state = state
+
+# Entries are kept in access order, so the least recently used session is
+# always at the front: eviction pops it in O(1) and the sweeper only walks
+# the expired prefix instead of scanning every session.
+class LRUStore:
+
+    def __init__(self, max_sessions: int = 10_000, idle_ttl: float = 3600.0,
+                 sweep_interval: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.stats = StoreStats()
+        self._clock = clock
+        self._data: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.idle_ttl > 0 and now - entry.touched > self.idle_ttl
+
+    def get(self, user_id: int) -> Optional[TutorState]:
+        entry = self._data.get(user_id)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        now = self._clock()
+        if self._expired(entry, now):
+            # not swept yet, but already dead for the caller
+            del self._data[user_id]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        entry.touched = now
+        self._data.move_to_end(user_id)
+        self.stats.hits += 1
+        return entry.state
+
+    def peek(self, user_id: int) -> Optional[TutorState]:
+        # for reading someone else's session (reminders, class progress): it
+        # keeps its place in the LRU order and its idle time runs on
+        entry = self._data.get(user_id)
+        if entry is None or self._expired(entry, self._clock()):
+            return None
+        return entry.state
+
+    async def fetch(self, user_id: int) -> Optional[TutorState]:
+        return self.peek(user_id)
+
+    def set(self, user_id: int, state: TutorState) -> None:
+        entry = self._data.get(user_id)
+        now = self._clock()
+        if entry is not None:
+            entry.touched = now
+            entry.state = state
+            self._data.move_to_end(user_id)
+            return
+        self._data[user_id] = _Entry(now, state)
+        while len(self._data) > self.max_sessions:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self, user_id: int) -> None:
+        self._data.pop(user_id, None)
+
+    async def load(self, user_id: int) -> None:
+        pass
+
+    def sweep(self) -> int:
+        now = self._clock()
+        removed = 0
+        while self._data:
+            user_id = next(iter(self._data))
+            if not self._expired(self._data[user_id], now):
+                break
+            del self._data[user_id]
+            removed += 1
+        self.stats.expirations += removed
+        return removed
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    async def start(self) -> None:
+        if self._sweeper is None and self.idle_ttl > 0:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+# What handlers get as `store`: MemoryStore, LRUStore or SQLiteStore
+SessionStore = Union[MemoryStore, LRUStore, "SQLiteStore"]
+
+def make_store(kind: str = "memory", max_sessions: int = 10_000, idle_ttl: float = 3600.0,
+               path: str = "sessions.db") -> SessionStore:
+    # "memory" keeps sessions forever, "lru" caps them and expires idle ones,
+    # "sqlite" persists them to `path` with an "lru" cache in front
+    if kind == "lru":
+        return LRUStore(max_sessions=max_sessions, idle_ttl=idle_ttl)
+    if kind == "sqlite":
+        from .sqlite_store import SQLiteStore
+        return SQLiteStore(path, LRUStore(max_sessions=max_sessions, idle_ttl=idle_ttl), idle_ttl=idle_ttl)
+    return MemoryStore()
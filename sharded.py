@@ -0,0 +1,324 @@
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from . import metrics
+from .config import get_settings
+from .dedup import DedupMiddleware
+from .outbox import Outbox
+
+log = logging.getLogger(__name__)
+
+# Each shard has two one-way pipes carrying JSON batches: front -> shard a
+# list of updates, shard -> front a list of [chat_id, [texts]]; an empty
+# message asks the shard to stop. Both sides collect what one loop iteration
+# produced and write it at once, through a _Sender.
+
+class _Sender:
+    # Writes to the sending end of a pipe from its own thread. When both
+    # processes write faster than the other reads, a full pipe blocks this
+    # thread, never the event loop, which keeps reading, so the two can't
+    # deadlock. Up to `max_batches` wait; more are dropped and reported to
+    # `on_lost` with the number of items they carried. The thread owns the
+    # connection and closes it once everything sent before close() is written.
+    def __init__(self, conn: Connection, on_lost: Callable[[int], None], name: str,
+                 max_batches: int = 1024):
+        self.conn = conn
+        self.on_lost = on_lost
+        self.max_batches = max_batches
+        self._loop = asyncio.get_running_loop()
+        self._queue: "queue.Queue[Optional[Tuple[bytes, int]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def send(self, data: bytes, items: int = 0) -> None:
+        if self._queue.qsize() >= self.max_batches:
+            self.on_lost(items)
+            return
+        self._queue.put_nowait((data, items))
+
+    def _run(self) -> None:
+        failed = False
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                data, items = item
+                if not failed:
+                    try:
+                        self.conn.send_bytes(data)
+                        continue
+                    except OSError:
+                        # the other side is gone; the reader of its pipe notices
+                        failed = True
+                if items:
+                    try:
+                        self._loop.call_soon_threadsafe(self.on_lost, items)
+                    except RuntimeError:
+                        pass  # the loop is closed already
+        finally:
+            self.conn.close()
+
+    def close(self) -> None:
+        self._queue.put_nowait(None)
+
+    async def wait_closed(self) -> None:
+        await self._loop.run_in_executor(None, self._thread.join)
+
+class ShardOutbox:
+    # the outbox handlers see inside a shard: replies go back to the front
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self._batch: List[Any] = []
+        self._sender: Optional[_Sender] = None
+
+    def _lost(self, replies: int) -> None:
+        log.warning("Dropped %d replies, the front is not reading them", replies)
+
+    def send(self, chat_id: int, *texts: str) -> None:
+        texts = [t for t in texts if t]
+        if not texts:
+            return
+        if not self._batch:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self._batch.append([chat_id, texts])
+
+    def flush(self) -> None:
+        if self._batch:
+            batch, self._batch = self._batch, []
+            self._sender.send(json.dumps(batch, ensure_ascii=False).encode(), len(batch))
+
+    async def start(self) -> None:
+        if self._sender is None:
+            self._sender = _Sender(self.conn, self._lost, "shard-replies")
+
+    async def stop(self) -> None:
+        if self._sender is not None:
+            self.flush()
+            self._sender.close()
+            await self._sender.wait_closed()
+            self._sender = None
+
+async def _serve_shard(conn: Connection, replies: Connection, metrics_port: int,
+                       shard: Tuple[int, int]) -> None:
+    from .main import build_bot, build_dispatcher
+
+    bot = build_bot()
+    outbox = ShardOutbox(replies)
+    dp = build_dispatcher(bot, outbox=outbox, metrics_port=metrics_port, shard=shard)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    stopped = asyncio.Event()
+
+    def on_readable() -> None:
+        try:
+            raw = conn.recv_bytes()
+        except EOFError:
+            raw = b""
+        if not raw:
+            loop.remove_reader(conn.fileno())
+            stopped.set()
+            return
+        for item in json.loads(raw):
+            update = Update.model_validate(item, context={"bot": bot})
+            task = loop.create_task(dp.feed_update(bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    loop.add_reader(conn.fileno(), on_readable)
+    try:
+        await stopped.wait()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    finally:
+        await bot.session.close()
+        conn.close()
+
+def _shard_main(shard: int, workers: int, conn: Connection, replies: Connection, metrics_port: int) -> None:
+    # Ctrl+C reaches the whole process group; the front stops shards itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_shard(conn, replies, metrics_port, (shard, workers)))
+
+@dataclass
+class ShardStats:
+    forwarded: int = 0
+    replies: int = 0
+    restarts: int = 0
+    # updates that could not be written to a shard that had just died, or
+    # that found too many batches waiting for it
+    lost: int = 0
+
+class _Shard:
+    __slots__ = ("process", "conn", "sender", "started", "buffer")
+
+    def __init__(self):
+        self.process: Optional[multiprocessing.Process] = None
+        # replies from the shard; updates go to it through `sender`
+        self.conn: Optional[Connection] = None
+        self.sender: Optional[_Sender] = None
+        self.started = 0.0
+        self.buffer: List[str] = []
+
+# Outer update middleware of the front dispatcher: instead of handling an
+# update it forwards it to shard `user_id % workers`, so a user's session only
+# ever lives in one process and sessions need no sharing. Replies coming back
+# go through the front's Outbox, which keeps the flood limits global. A shard
+# that exits is started again (after `restart_delay` if it died right after
+# starting); its in-memory sessions are lost, the updates meanwhile wait.
+class ShardPool(BaseMiddleware):
+    def __init__(self, workers: int, outbox: Outbox, metrics_port: int = 0, restart_delay: float = 1.0):
+        self.workers = workers
+        self.outbox = outbox
+        self.metrics_port = metrics_port
+        self.restart_delay = restart_delay
+        self.stats = ShardStats()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._shards = [_Shard() for _ in range(workers)]
+        self._dirty: List[int] = []
+        self._stopping = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        key = user.id if user is not None else event.update_id
+        self.submit(key, event.model_dump_json(exclude_unset=True, by_alias=True))
+        return None
+
+    def submit(self, key: int, update_json: str) -> None:
+        index = key % self.workers
+        shard = self._shards[index]
+        if not shard.buffer:
+            if not self._dirty:
+                self._loop.call_soon(self._flush)
+            self._dirty.append(index)
+        shard.buffer.append(update_json)
+        self.stats.forwarded += 1
+
+    def _flush(self) -> None:
+        dirty, self._dirty = self._dirty, []
+        for index in dirty:
+            shard = self._shards[index]
+            if shard.conn is None:
+                continue  # restarting; _spawn flushes it
+            batch, shard.buffer = shard.buffer, []
+            shard.sender.send(("[" + ",".join(batch) + "]").encode(), len(batch))
+
+    def _lost(self, updates: int) -> None:
+        self.stats.lost += updates
+
+    def _spawn(self, index: int) -> None:
+        if self._stopping:
+            return
+        shard = self._shards[index]
+        updates_r, updates_w = self._ctx.Pipe(duplex=False)
+        replies_r, replies_w = self._ctx.Pipe(duplex=False)
+        port = self.metrics_port + 1 + index if self.metrics_port else 0
+        shard.process = self._ctx.Process(target=_shard_main,
+                                          args=(index, self.workers, updates_r, replies_w, port),
+                                          name=f"mathcoach-shard-{index}", daemon=True)
+        shard.process.start()
+        updates_r.close()
+        replies_w.close()
+        shard.conn = replies_r
+        shard.sender = _Sender(updates_w, self._lost, f"shard-{index}-updates")
+        shard.started = time.monotonic()
+        self._loop.add_reader(replies_r.fileno(), self._on_readable, index)
+        if shard.buffer:
+            self._dirty.append(index)
+            self._flush()
+
+    def _on_readable(self, index: int) -> None:
+        shard = self._shards[index]
+        try:
+            raw = shard.conn.recv_bytes()
+        except (EOFError, OSError):
+            self._restart(index)
+            return
+        for chat_id, texts in json.loads(raw):
+            self.outbox.send(chat_id, *texts)
+            self.stats.replies += 1
+
+    def _restart(self, index: int) -> None:
+        shard = self._shards[index]
+        if shard.conn is None:
+            return
+        self._loop.remove_reader(shard.conn.fileno())
+        shard.conn.close()
+        shard.conn = None
+        # updates still queued for it are counted as lost by the sender
+        shard.sender.close()
+        shard.sender = None
+        shard.process.join(timeout=1)
+        if self._stopping:
+            return
+        self.stats.restarts += 1
+        log.warning("Shard %s exited with code %s, restarting", index, shard.process.exitcode)
+        if time.monotonic() - shard.started < self.restart_delay * 5:
+            self._loop.call_later(self.restart_delay, self._spawn, index)
+        else:
+            self._spawn(index)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        for index in range(self.workers):
+            self._spawn(index)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        self._flush()
+        self._stopping = True
+        for shard in self._shards:
+            if shard.sender is not None:
+                shard.sender.send(b"")
+        # replies keep arriving until each shard closes its end
+        deadline = time.monotonic() + timeout
+        while any(s.conn is not None for s in self._shards) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for index, shard in enumerate(self._shards):
+            if shard.conn is not None:
+                self._restart(index)
+            if shard.process is not None and shard.process.is_alive():
+                shard.process.terminate()
+
+def build_sharded_dispatcher(bot: Bot, workers: int, outbox: Optional[Outbox] = None,
+                             metrics_port: Optional[int] = None) -> Dispatcher:
+    # front process: no routers, every update goes to a shard
+    settings = get_settings()
+    if metrics_port is None:
+        metrics_port = settings.metrics_port
+    dp = Dispatcher()
+    if outbox is None:
+        outbox = Outbox(bot, settings.outbox_chat_interval, settings.outbox_global_rate)
+    dp["outbox"] = outbox
+    pool = ShardPool(workers, outbox, metrics_port)
+    # duplicates are dropped here, before they cross a pipe
+    dp.update.outer_middleware(DedupMiddleware(settings.dedup_window, settings.dedup_max_size))
+    dp.update.outer_middleware(pool)
+    dp["shards"] = pool
+    dp.startup.register(outbox.start)
+    dp.startup.register(pool.start)
+    # shards first, so their last replies still reach the outbox
+    dp.shutdown.register(pool.stop)
+    dp.shutdown.register(outbox.stop)
+    if metrics_port:
+        metrics.serve(dp, settings.metrics_host, metrics_port)
+    return dp
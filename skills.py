@@ -1,363 +1,522 @@
-
 from __future__ import annotations
+import asyncio
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, List, Tuple
-import re
 from fractions import Fraction
+from typing import Optional, Dict, Callable, Tuple, Type, Union
 from math import isclose
 
+from .answers import FRACTION, Answer, mentions_none
+from .classify import Classifier
+from .problem import parse_problem, remember_polynomial, slow_sides, solve_problem, sympy_polynomial
+from .registry import SkillRegistry, checker
 from .session import Step, TutorState
-from .utils import is_number, to_float
+from .symbolic import SymbolicCheck, get_checker
+
+SKILLS = SkillRegistry()
+
+# checker(skill, state, answer) -> (feedback, accepted), where answer is the
+# student's message parsed once (answers.parse_answer); an accepted answer
+# moves the session to the next step, the last one finishes it. A checker
+# that needs sympy returns a symbolic.SymbolicCheck instead.
+Checker = Callable[["Skill", TutorState, Answer], Union[Tuple[str, bool], SymbolicCheck]]
 
-@dataclass
 class Skill:
     id: str
+    # {regex over classify.normalize() text: weight}, see classify.Classifier
+    signature: Dict[str, float] = {}
+    # shared, immutable step sequence; sessions only keep a reference to it
+    steps: Tuple[Step, ...] = ()
+    scratch_type: Optional[Type] = None
+    # method outline shown by /giveup
+    giveup_plan: str = ""
+    # answer_checker id -> checker, collected from @checker methods
+    checkers: Dict[str, Checker] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.checkers = {**cls.checkers, **{
+            fn.checker_id: fn for fn in vars(cls).values() if hasattr(fn, "checker_id")
+        }}
 
     def match(self, problem_text: str) -> float:
-        raise NotImplementedError
+        return classifier().rank(problem_text).score(self.id)
+
+    def parse(self, problem_text: str):
+        return parse_problem(self.id, problem_text)
+
+    def solve(self, problem_text: str):
+        return solve_problem(self.id, problem_text)
+
+    async def prepare(self, problem_text: str) -> None:
+        # what the bot awaits before init(): the parts of the problem only sympy
+        # can read are parsed in the symbolic process pool, not on the loop
+        sides = slow_sides(self.id, problem_text)
+        if sides:
+            checker = get_checker()
+            results = await asyncio.gather(*(checker.call(sympy_polynomial, side) for side in sides))
+            for side, coefs in zip(sides, results):
+                remember_polynomial(side, coefs)
 
     def init(self, problem_text: str) -> TutorState:
-        raise NotImplementedError
+        return TutorState(skill_id=self.id, problem_text=problem_text, steps=self.steps,
+                          problem=self.parse(problem_text), trace=self.solve(problem_text))
 
-    def next_step(self, state: TutorState, user_text: str) -> Tuple[str, Optional[Step]]:
-        raise NotImplementedError
+    def scratch(self, state: TutorState):
+        # created by the first step that keeps a value, so a session that was
+        # just started doesn't carry one
+        if state.scratch is None:
+            state.scratch = self.scratch_type()
+        return state.scratch
 
-class LinearEq(Skill):
-    id = "linear_eq"
+    def _check(self, state: TutorState, answer: Answer):
+        check = self.checkers.get(state.steps[state.step_index].answer_checker)
+        return check(self, state, answer) if check else ("Ок.", True)
 
-    def match(self, problem_text: str) -> float:
-        return 0.7 if "x" in problem_text and "^2" not in problem_text else 0.0
+    def next_step(self, state: TutorState, answer: Answer) -> Tuple[str, Optional[Step]]:
+        # for tools without an event loop
+        result = self._check(state, answer)
+        if isinstance(result, SymbolicCheck):
+            result = _symbolic_result(result, get_checker().check_sync(*result[:3]))
+        return self._advance(state, *result)
 
-    def init(self, problem_text: str) -> TutorState:
-        steps = [
-            Step(
-                prompt="Какой коэффициент при x (a) в уравнении? Напиши число.",
-                hint_levels=["Посмотри на множитель, который стоит рядом с x.",
-                             "Если x без числа — коэффициент равен 1 или -1.",
-                             "В записи ax+b=c — a это число перед x."],
-                answer_checker="coef_a"
-            ),
-            Step(
-                prompt="Какое свободное слагаемое перенесено влево (b) в форме ax + b = c?",
-                hint_levels=["Ищи число, которое стоит отдельно от x в левой части.",
-                             "Знак важен: если '- 5', то b = -5.",
-                             "В форме ax + b = c — b это 'плюс/минус число' слева."],
-                answer_checker="coef_b"
-            ),
-            Step(
-                prompt="Чему равна правая часть (c)? Напиши число.",
-                hint_levels=["Смотри на число после знака '='.",
-                             "Если справа выражение — оцени его значение.",
-                             "В форме ax + b = c — c это правая часть."],
-                answer_checker="coef_c"
-            ),
-            Step(
-                prompt="Выполни шаг: вычти b из обеих частей. Чему равно a·x после этого шага?",
-                hint_levels=["a·x = c - b.",
-                             "Подставь найденные a, b, c в c - b.",
-                             "Запиши результат как число."],
-                answer_checker="ax_after"
-            ),
-            Step(
-                prompt="Теперь раздели обе части на a. Чему равен x? (число)",
-                hint_levels=["x = (c - b)/a.",
-                             "Подставь свои значения.",
-                             "Вычисли численно, округление не требуется."],
-                answer_checker="x_value"
-            ),
-        ]
-        return TutorState(skill_id=self.id, problem_text=problem_text, steps=steps, scratch={})
-
-    def next_step(self, state: TutorState, user_text: str):
-        i = state.step_index
-        step = state.steps[i]
-        if step.answer_checker == "coef_a":
-            if is_number(user_text):
-                state.scratch["a"] = to_float(user_text)
-                fb = f"Принято: a = {state.scratch['a']}"
-            else:
-                return ("Нужно число. Например: 2 или -3.", step)
-        elif step.answer_checker == "coef_b":
-            if is_number(user_text):
-                state.scratch["b"] = to_float(user_text)
-                fb = f"Ок: b = {state.scratch['b']}"
-            else:
-                return ("Ответ должен быть числом со знаком при необходимости.", step)
-        elif step.answer_checker == "coef_c":
-            if is_number(user_text):
-                state.scratch["c"] = to_float(user_text)
-                fb = f"Записал: c = {state.scratch['c']}"
-            else:
-                return ("Введи число.", step)
-        elif step.answer_checker == "ax_after":
-            if is_number(user_text):
-                val = to_float(user_text)
-                a = state.scratch.get("a"); b = state.scratch.get("b"); c = state.scratch.get("c")
-                if a is None or b is None or c is None:
-                    return ("Сначала определим a, b, c выше.", step)
-                expected = c - b
-                if abs(val - expected) <= max(1e-9, abs(expected)*1e-6):
-                    fb = f"Верно: a·x = c - b = {val:.6g}"
-                    state.scratch["ax_val"] = val
-                else:
-                    return (f"Проверь вычисления: должно получиться {expected:.6g} (из c - b). Попробуй ещё раз.", step)
-            else:
-                return ("Напиши число, которое равно c - b.", step)
-        elif step.answer_checker == "x_value":
-            if is_number(user_text):
-                val = to_float(user_text)
-                a = state.scratch.get("a"); ax = state.scratch.get("ax_val")
-                if a is None or ax is None:
-                    return ("Сначала вычислим c - b на предыдущем шаге.", step)
-                expected = ax / a
-                if abs(val - expected) <= max(1e-9, abs(expected)*1e-6):
-                    fb = f"Отлично! x = {val:.6g}. Ты сам пришёл к ответу."
-                    state.finished = True
-                    return (fb, None)
-                else:
-                    return (f"Не сходится. Подумай: x = (c - b)/a = {expected:.6g}. Введи точное значение.", step)
-            else:
-                return ("Нужно число.", step)
-        else:
-            fb = "Ок."
+    async def anext_step(self, state: TutorState, answer: Answer) -> Tuple[str, Optional[Step]]:
+        # what the bot uses: symbolic checks go to the process pool
+        result = self._check(state, answer)
+        if isinstance(result, SymbolicCheck):
+            result = _symbolic_result(result, await get_checker().check(*result[:3]))
+        return self._advance(state, *result)
 
+    def _advance(self, state: TutorState, fb: str, accepted: bool) -> Tuple[str, Optional[Step]]:
+        step = state.steps[state.step_index]
+        if not accepted:
+            return (fb, step)
         state.step_index += 1
+        state.hints_used = 0
         if state.step_index < len(state.steps):
             return (fb, state.steps[state.step_index])
         else:
             state.finished = True
             return (fb, None)
 
-class FracAdd(Skill):
-    id = "frac_add"
+def _symbolic_result(check: SymbolicCheck, equal: Optional[bool]) -> Tuple[str, bool]:
+    if equal is None:
+        return (check.undecided, False)
+    return (check.correct, True) if equal else (check.wrong, False)
 
-    def match(self, problem_text: str) -> float:
-        return 0.8 if re.search(r"\d+/\d+\s*\+\s*\d+/\d+", problem_text) else 0.0
+_ABS_TOL = Fraction(1, 10**9)
+_REL_TOL = Fraction(1, 10**6)
 
-    def init(self, problem_text: str) -> TutorState:
-        steps = [
-            Step("Какие знаменатели у дробей? Напиши через запятую.",
-                 ["Посмотри на числа снизу каждой дроби.",
-                  "Формат: b, d.",
-                  "Пример: 3, 4"],
-                 "denoms"),
-            Step("Найди общий знаменатель (НОК знаменателей).",
-                 ["Подумай о кратном обоим знаменателям.",
-                  "Найди наименьшее общее кратное.",
-                  "Пример: для 3 и 4 — 12."],
-                 "lcd"),
-            Step("Приведи обе дроби к общему знаменателю. Каковы новые числители? (через запятую)",
-                 ["Умножь числитель и знаменатель каждой дроби на недостающий множитель.",
-                  "Формат: n1, n2",
-                  "Не сокращай пока."],
-                 "new_nums"),
-            Step("Сложи числители. Какой числитель итоговой дроби?",
-                 ["Сложи два получившихся числителя.", "Только число.", "Проверь внимательно."],
-                 "sum_num"),
-            Step("Сократи дробь, если возможно. Запиши окончательный ответ в виде несократимой дроби n/m.",
-                 ["Раздели числитель и знаменатель на их НОД.",
-                  "Можно привести к неправильной дроби.",
-                  "Убедись, что сократить больше нельзя."],
-                 "final_frac"),
-        ]
-        return TutorState(skill_id=self.id, problem_text=problem_text, steps=steps, scratch={})
-
-    def next_step(self, state: TutorState, user_text: str):
-        i = state.step_index
-        step = state.steps[i]
-        if step.answer_checker == "denoms":
-            parts = [p.strip() for p in user_text.replace(";", ",").split(",")]
-            if len(parts) != 2 or not all(p.isdigit() for p in parts):
-                return ("Формат: b, d. Пример: 3, 4", step)
-            b, d = map(int, parts)
-            state.scratch.update({"b": b, "d": d})
-            fb = f"Ок, знаменатели: {b} и {d}."
-        elif step.answer_checker == "lcd":
-            if not is_number(user_text):
-                return ("Введи число — общий знаменатель.", step)
-            lcd = int(float(user_text))
-            state.scratch["lcd"] = lcd
-            fb = f"Принято: общий знаменатель {lcd}."
-        elif step.answer_checker == "new_nums":
-            parts = [p.strip() for p in user_text.replace(";", ",").split(",")]
-            if len(parts) != 2 or not all(re.match(r"^-?\d+$", p) for p in parts):
-                return ("Формат: n1, n2 (только целые).", step)
-            n1, n2 = map(int, parts)
-            state.scratch.update({"n1": n1, "n2": n2})
-            fb = f"Есть: новые числители {n1} и {n2}."
-        elif step.answer_checker == "sum_num":
-            if not re.match(r"^-?\d+$", user_text.strip()):
-                return ("Нужно целое число.", step)
-            total = int(user_text.strip())
-            state.scratch["sum_num"] = total
-            fb = f"Сумма числителей = {total}."
-        elif step.answer_checker == "final_frac":
-            m = re.match(r"^\s*(-?\d+)\s*/\s*(\d+)\s*$", user_text)
-            if not m:
-                return ("Формат ответа: n/m (например, 7/12).", step)
-            n, m_ = int(m.group(1)), int(m.group(2))
-            fr = Fraction(n, m_)
-            if fr.numerator != n or fr.denominator != m_:
-                fb = f"Хорошо! Несократимый вид: {fr.numerator}/{fr.denominator}."
-            else:
-                fb = "Отлично! Дробь уже несократима."
-            state.finished = True
-            return (fb, None)
+def _close(val, expected) -> bool:
+    # an answer's Fraction against the trace's is compared exactly
+    return abs(val - expected) <= max(_ABS_TOL, abs(expected) * _REL_TOL)
+
+@dataclass(slots=True)
+class LinearScratch:
+    a: Optional[float] = None
+    b: Optional[float] = None
+    c: Optional[float] = None
+    ax_val: Optional[float] = None
+
+@SKILLS.register
+class LinearEq(Skill):
+    id = "linear_eq"
+    signature = {r"x": 0.5, r"=": 0.3, r"x\^2": -1.0, r"линейн": 0.3}
+    scratch_type = LinearScratch
+    giveup_plan = ("План решения линейного уравнения ax + b = c:\n"
+                   "1) Вычесть b из обеих частей: a·x = c - b\n"
+                   "2) Разделить обе части на a: x = (c - b)/a\n"
+                   "Попробуй продолжить сам(а) 😉")
+    steps = (
+        Step(
+            prompt="Какой коэффициент при x (a) в уравнении? Напиши число.",
+            hint_levels=("Посмотри на множитель, который стоит рядом с x.",
+                         "Если x без числа — коэффициент равен 1 или -1.",
+                         "В записи ax+b=c — a это число перед x."),
+            answer_checker="coef_a"
+        ),
+        Step(
+            prompt="Какое свободное слагаемое перенесено влево (b) в форме ax + b = c?",
+            hint_levels=("Ищи число, которое стоит отдельно от x в левой части.",
+                         "Знак важен: если '- 5', то b = -5.",
+                         "В форме ax + b = c — b это 'плюс/минус число' слева."),
+            answer_checker="coef_b"
+        ),
+        Step(
+            prompt="Чему равна правая часть (c)? Напиши число.",
+            hint_levels=("Смотри на число после знака '='.",
+                         "Если справа выражение — оцени его значение.",
+                         "В форме ax + b = c — c это правая часть."),
+            answer_checker="coef_c"
+        ),
+        Step(
+            prompt="Выполни шаг: вычти b из обеих частей. Чему равно a·x после этого шага?",
+            hint_levels=("a·x = c - b.",
+                         "Подставь найденные a, b, c в c - b.",
+                         "Запиши результат как число."),
+            answer_checker="ax_after"
+        ),
+        Step(
+            prompt="Теперь раздели обе части на a. Чему равен x? (число)",
+            hint_levels=("x = (c - b)/a.",
+                         "Подставь свои значения.",
+                         "Вычисли численно, округление не требуется."),
+            answer_checker="x_value"
+        ),
+    )
+
+    @checker("coef_a")
+    def check_coef_a(self, state: TutorState, answer: Answer):
+        if not answer.is_number:
+            return ("Нужно число. Например: 2 или -3.", False)
+        if state.problem and not _close(answer.value, state.problem.a):
+            return ("Не совсем. Посмотри ещё раз, какое число стоит перед x, и на его знак.", False)
+        value = self.scratch(state).a = float(answer.value)
+        return (f"Принято: a = {value}", True)
+
+    @checker("coef_b")
+    def check_coef_b(self, state: TutorState, answer: Answer):
+        if not answer.is_number:
+            return ("Ответ должен быть числом со знаком при необходимости.", False)
+        if state.problem and not _close(answer.value, state.problem.b):
+            return ("Не совсем. Какое число стоит в левой части отдельно от x? Знак важен.", False)
+        value = self.scratch(state).b = float(answer.value)
+        return (f"Ок: b = {value}", True)
+
+    @checker("coef_c")
+    def check_coef_c(self, state: TutorState, answer: Answer):
+        if not answer.is_number:
+            return ("Введи число.", False)
+        if state.problem and not _close(answer.value, state.problem.c):
+            return ("Не совсем. Посмотри на число в правой части, после '='.", False)
+        value = self.scratch(state).c = float(answer.value)
+        return (f"Записал: c = {value}", True)
+
+    @checker("ax_after")
+    def check_ax_after(self, state: TutorState, answer: Answer):
+        if not answer.is_number:
+            return ("Напиши число, которое равно c - b.", False)
+        val = answer.value
+        sc = self.scratch(state)
+        if state.trace:
+            expected = state.trace.ax
+        elif sc.a is None or sc.b is None or sc.c is None:
+            return ("Сначала определим a, b, c выше.", False)
         else:
-            fb = "Ок."
+            expected = sc.c - sc.b
+        if not _close(val, expected):
+            return (f"Проверь вычисления: должно получиться {float(expected):.6g} (из c - b). Попробуй ещё раз.", False)
+        sc.ax_val = float(val)
+        return (f"Верно: a·x = c - b = {sc.ax_val:.6g}", True)
 
-        state.step_index += 1
-        if state.step_index < len(state.steps):
-            return (fb, state.steps[state.step_index])
+    @checker("x_value")
+    def check_x_value(self, state: TutorState, answer: Answer):
+        if not answer.is_number:
+            return ("Нужно число.", False)
+        val = answer.value
+        sc = self.scratch(state)
+        if state.trace:
+            expected = state.trace.x
+        elif sc.a is None or sc.ax_val is None:
+            return ("Сначала вычислим c - b на предыдущем шаге.", False)
         else:
-            state.finished = True
-            return (fb, None)
+            expected = sc.ax_val / sc.a
+        if not _close(val, expected):
+            return (f"Не сходится. Подумай: x = (c - b)/a = {float(expected):.6g}. Введи точное значение.", False)
+        return (f"Отлично! x = {float(val):.6g}. Ты сам пришёл к ответу.", True)
+
+@dataclass(slots=True)
+class FracScratch:
+    b: Optional[int] = None
+    d: Optional[int] = None
+    lcd: Optional[int] = None
+    n1: Optional[int] = None
+    n2: Optional[int] = None
+    sum_num: Optional[int] = None
 
+@SKILLS.register
+class FracAdd(Skill):
+    id = "frac_add"
+    signature = {r"\d+/\d+\+\d+/\d+": 0.85, r"дроб": 0.3, r"слож": 0.1}
+    scratch_type = FracScratch
+    giveup_plan = ("План сложения дробей a/b + c/d:\n"
+                   "1) Найди НОК знаменателей\n"
+                   "2) Приведи дроби к нему\n"
+                   "3) Сложи числители и сократи")
+    steps = (
+        Step("Какие знаменатели у дробей? Напиши через запятую.",
+             ("Посмотри на числа снизу каждой дроби.",
+              "Формат: b, d.",
+              "Пример: 3, 4"),
+             "denoms"),
+        Step("Найди общий знаменатель (НОК знаменателей).",
+             ("Подумай о кратном обоим знаменателям.",
+              "Найди наименьшее общее кратное.",
+              "Пример: для 3 и 4 — 12."),
+             "lcd"),
+        Step("Приведи обе дроби к общему знаменателю. Каковы новые числители? (через запятую)",
+             ("Умножь числитель и знаменатель каждой дроби на недостающий множитель.",
+              "Формат: n1, n2",
+              "Не сокращай пока."),
+             "new_nums"),
+        Step("Сложи числители. Какой числитель итоговой дроби?",
+             ("Сложи два получившихся числителя.", "Только число.", "Проверь внимательно."),
+             "sum_num"),
+        Step("Сократи дробь, если возможно. Запиши окончательный ответ в виде несократимой дроби n/m.",
+             ("Раздели числитель и знаменатель на их НОД.",
+              "Можно привести к неправильной дроби.",
+              "Убедись, что сократить больше нельзя."),
+             "final_frac"),
+    )
+
+    @checker("denoms")
+    def check_denoms(self, state: TutorState, answer: Answer):
+        values = answer.numbers()
+        if not values or len(values) != 2 or not all(v.denominator == 1 and v > 0 for v in values):
+            return ("Формат: b, d. Пример: 3, 4", False)
+        b, d = map(int, values)
+        p = state.problem
+        if p and sorted((b, d)) != sorted((p.d1, p.d2)):
+            return ("Это не знаменатели из задачи — посмотри на числа под чертой каждой дроби.", False)
+        sc = self.scratch(state)
+        sc.b, sc.d = b, d
+        return (f"Ок, знаменатели: {b} и {d}.", True)
+
+    @checker("lcd")
+    def check_lcd(self, state: TutorState, answer: Answer):
+        if not answer.is_integer:
+            return ("Введи целое число — общий знаменатель.", False)
+        lcd = int(answer.value)
+        t = state.trace
+        if t and lcd != t.lcd:
+            p = state.problem
+            if lcd > 0 and lcd % p.d1 == 0 and lcd % p.d2 == 0:
+                return ("Это общий знаменатель, но не наименьший. Найди меньшее общее кратное.", False)
+            return (f"{lcd} не делится на оба знаменателя. Найди наименьшее общее кратное {p.d1} и {p.d2}.", False)
+        self.scratch(state).lcd = lcd
+        return (f"Принято: общий знаменатель {lcd}.", True)
+
+    @checker("new_nums")
+    def check_new_nums(self, state: TutorState, answer: Answer):
+        values = answer.numbers()
+        if not values or len(values) != 2 or not all(v.denominator == 1 for v in values):
+            return ("Формат: n1, n2 (только целые).", False)
+        n1, n2 = map(int, values)
+        t = state.trace
+        if t and (n1, n2) != (t.m1, t.m2):
+            return ("Не сходится. Числитель умножается на то же число, что и знаменатель, чтобы получить "
+                    f"{t.lcd}. Порядок: сначала первая дробь.", False)
+        sc = self.scratch(state)
+        sc.n1, sc.n2 = n1, n2
+        return (f"Есть: новые числители {n1} и {n2}.", True)
+
+    @checker("sum_num")
+    def check_sum_num(self, state: TutorState, answer: Answer):
+        if not answer.is_integer:
+            return ("Нужно целое число.", False)
+        total = int(answer.value)
+        if state.trace and total != state.trace.sum_num:
+            return ("Проверь сложение новых числителей.", False)
+        self.scratch(state).sum_num = total
+        return (f"Сумма числителей = {total}.", True)
+
+    @checker("final_frac")
+    def check_final_frac(self, state: TutorState, answer: Answer):
+        if answer.kind != FRACTION:
+            if "/" in answer.body:
+                return ("Проверь дробь: числитель и знаменатель — целые, знаменатель не ноль.", False)
+            return ("Формат ответа: n/m (например, 7/12).", False)
+        fr = answer.value
+        if state.trace and fr != state.trace.result:
+            return ("Эта дробь не равна сумме. Раздели сумму числителей и общий знаменатель на их НОД.", False)
+        if "".join(answer.body.split()).lstrip("+") != f"{fr.numerator}/{fr.denominator}":
+            return (f"Хорошо! Несократимый вид: {fr.numerator}/{fr.denominator}.", True)
+        return ("Отлично! Дробь уже несократима.", True)
+
+@dataclass(slots=True)
+class QuadraticScratch:
+    a: Optional[float] = None
+    b: Optional[float] = None
+    c: Optional[float] = None
+    D: Optional[float] = None
+    roots_count: Optional[int] = None
+
+@SKILLS.register
 class QuadraticEq(Skill):
     id = "quadratic_eq"
+    signature = {r"x\^2": 0.9, r"discriminant|дискриминант": 0.6, r"квадратн": 0.5}
+    scratch_type = QuadraticScratch
+    giveup_plan = ("План решения квадратного уравнения:\n"
+                   "1) Определи a, b, c\n"
+                   "2) Посчитай D = b² - 4ac\n"
+                   "3) Если D≥0, x = (-b ± √D)/(2a)")
+    steps = (
+        Step("Определи коэффициенты a, b, c в уравнении ax^2 + bx + c = 0. Напиши: a, b, c",
+             ("Смотри на множители при x^2 и x, и свободный член.",
+              "Не забудь про знаки.",
+              "Формат: a, b, c (например, 1, -5, 6)"),
+             "abc"),
+        Step("Найди дискриминант: D = b^2 - 4ac. Введи его значение.",
+             ("Подставь свои a, b, c.",
+              "Сначала посчитай b^2, затем 4ac.",
+              "Только число."),
+             "disc"),
+        Step("Сколько корней уравнения? (введи 0, 1 или 2)",
+             ("Если D > 0 — два корня; D = 0 — один; D < 0 — нет действительных корней.",
+              "Сравни D с нулем.",
+              "Только 0/1/2."),
+             "roots_count"),
+        Step("Вычисли корень(я) по формуле: x = (-b ± √D) / (2a). Введи через запятую (если два), "
+             "или напиши «нет», если корней нет.",
+             ("Используй точные значения; если √D не извлекается, округли до сотых.",
+              "Порядок любой, раздели запятой.",
+              "Для одного корня введи только его."),
+             "roots_values"),
+    )
 
-    def match(self, problem_text: str) -> float:
-        return 0.9 if ("x^2" in problem_text or "x²" in problem_text) else 0.0
+    @checker("abc")
+    def check_abc(self, state: TutorState, answer: Answer):
+        if len(answer.items) != 3:
+            return ("Формат: a, b, c (например, 1, -5, 6).", False)
+        values = answer.numbers()
+        if values is None:
+            return ("Коэффициенты должны быть числами.", False)
+        a, b, c = values
+        p = state.problem
+        if p and not (_close(a, p.a) and _close(b, p.b) and _close(c, p.c)):
+            return ("Проверь коэффициенты: перенеси всё в левую часть (… = 0) и не забудь про знаки.", False)
+        sc = self.scratch(state)
+        a, b, c = sc.a, sc.b, sc.c = tuple(map(float, values))
+        return (f"Записал: a={a}, b={b}, c={c}.", True)
 
-    def init(self, problem_text: str) -> TutorState:
-        steps = [
-            Step("Определи коэффициенты a, b, c в уравнении ax^2 + bx + c = 0. Напиши: a, b, c",
-                 ["Смотри на множители при x^2 и x, и свободный член.",
-                  "Не забудь про знаки.",
-                  "Формат: a, b, c (например, 1, -5, 6)"],
-                 "abc"),
-            Step("Найди дискриминант: D = b^2 - 4ac. Введи его значение.",
-                 ["Подставь свои a, b, c.",
-                  "Сначала посчитай b^2, затем 4ac.",
-                  "Только число."],
-                 "disc"),
-            Step("Сколько корней уравнения? (введи 0, 1 или 2)",
-                 ["Если D > 0 — два корня; D = 0 — один; D < 0 — нет действительных корней.",
-                  "Сравни D с нулем.",
-                  "Только 0/1/2."],
-                 "roots_count"),
-            Step("Вычисли корень(я) по формуле: x = (-b ± √D) / (2a). Введи через запятую (если два).",
-                 ["Используй точные значения. Округлять не нужно.",
-                  "Порядок любой, раздели запятой.",
-                  "Для одного корня введи только его."],
-                 "roots_values"),
-        ]
-        return TutorState(skill_id=self.id, problem_text=problem_text, steps=steps, scratch={})
-
-    def next_step(self, state: TutorState, user_text: str):
-        i = state.step_index
-        step = state.steps[i]
-        if step.answer_checker == "abc":
-            parts = [p.strip() for p in user_text.replace(";", ",").split(",")]
-            if len(parts) != 3:
-                return ("Формат: a, b, c (например, 1, -5, 6).", step)
-            try:
-                a, b, c = map(float, parts)
-            except:
-                return ("Коэффициенты должны быть числами.", step)
-            state.scratch.update({"a": a, "b": b, "c": c})
-            fb = f"Записал: a={a}, b={b}, c={c}."
-        elif step.answer_checker == "disc":
-            try:
-                D = float(user_text.replace(",", "."))
-            except:
-                return ("Введи числовое значение дискриминанта.", step)
-            state.scratch["D"] = D
-            fb = f"D = {D}."
-        elif step.answer_checker == "roots_count":
-            if user_text.strip() not in {"0","1","2"}:
-                return ("Введи 0, 1 или 2.", step)
-            cnt = int(user_text.strip())
-            state.scratch["roots_count"] = cnt
-            fb = f"Принято: {cnt} корень(я)."
-        elif step.answer_checker == "roots_values":
-            parts = [p.strip() for p in user_text.replace(";", ",").split(",") if p.strip()]
-            xs = []
-            for p in parts:
-                try:
-                    xs.append(float(p.replace(",", ".")))
-                except:
-                    return ("Корни должны быть числами, раздели запятой.", step)
-            fb = "Отличная работа! Ты вывел(а) корни сам(а)."
-            state.finished = True
-            return (fb, None)
-        else:
-            fb = "Ок."
+    @checker("disc")
+    def check_disc(self, state: TutorState, answer: Answer):
+        if not answer.is_number:
+            return ("Введи числовое значение дискриминанта.", False)
+        if state.trace and not _close(answer.value, state.trace.D):
+            return ("Пересчитай: сначала b², потом 4·a·c, и вычти второе из первого.", False)
+        value = self.scratch(state).D = float(answer.value)
+        return (f"D = {value}.", True)
 
-        state.step_index += 1
-        if state.step_index < len(state.steps):
-            return (fb, state.steps[state.step_index])
+    @checker("roots_count")
+    def check_roots_count(self, state: TutorState, answer: Answer):
+        if not answer.is_integer or answer.value not in (0, 1, 2):
+            return ("Введи 0, 1 или 2.", False)
+        cnt = int(answer.value)
+        if state.trace and cnt != len(state.trace.roots):
+            return ("Сравни свой D с нулём ещё раз.", False)
+        self.scratch(state).roots_count = cnt
+        return (f"Принято: {cnt} корень(я).", True)
+
+    @checker("roots_values")
+    def check_roots_values(self, state: TutorState, answer: Answer):
+        t = state.trace
+        if t and not t.roots:
+            if not mentions_none(answer):
+                return ("При D < 0 действительных корней нет — так и напиши: нет.", False)
+            return ("Верно: действительных корней нет. Отличная работа!", True)
+        if answer.is_number and (not t or len(t.roots) == 1):
+            # one root, "-1,5" included
+            values = [answer.value]
         else:
-            state.finished = True
-            return (fb, None)
+            numbers = answer.numbers()
+            if not numbers:
+                return ("Корни должны быть числами, раздели запятой.", False)
+            values = list(numbers)
+        if t and (len(values) != len(t.roots) or
+                  not all(_close_root(v, r) for v, r in zip(sorted(values), t.roots))):
+            return ("Не сходится. Подставь a, b и D в x = (-b ± √D) / (2a) ещё раз.", False)
+        return ("Отличная работа! Ты вывел(а) корни сам(а).", True)
+
+def _close_root(val: Fraction, root) -> bool:
+    # irrational roots (floats in the trace) can only be typed rounded
+    if isinstance(root, float):
+        return abs(val - root) <= 0.006
+    return _close(val, root)
 
+@SKILLS.register
 class Proportion(Skill):
     id = "proportion"
+    signature = {r"[\dx.]+:[\dx.]+=[\dx.]+:[\dx.]+": 0.9, r"пропорц": 0.6}
+    giveup_plan = ("План решения пропорции a:b = c:x:\n"
+                   "1) Перейди к дробям: a/b = c/x\n"
+                   "2) Перемножь по диагонали: a·x = b·c\n"
+                   "3) Вырази x: x = (b·c)/a")
+    steps = (
+        Step("Запиши пропорцию в виде дробей: a/b = c/x. Что будет в числителе и знаменателе слева? (a/b)",
+             ("Читай пропорцию 'a относится к b'.",
+              "Левая дробь — первая пара.",
+              "Запиши как a/b."),
+             "left_frac"),
+        Step("Сформулируй правило: произведение крайних равно произведению средних. Как выглядит уравнение?",
+             ("a·x = b·c.", "Перемножь по диагонали.", "Запиши без вычислений."),
+             "diag_rule"),
+        Step("Вырази x из уравнения. Что получится?",
+             ("x = (b·c)/a.", "Сначала вырази x символически.", "Числа подставим позже."),
+             "solve_x"),
+        Step("Подставь числа из задачи и вычисли x. Напиши число.",
+             ("Аккуратно подставь и сократи при необходимости.", "Только число.", "Без округления."),
+             "x_value"),
+    )
 
-    def match(self, problem_text: str) -> float:
-        return 0.7 if (":" in problem_text and "=" in problem_text) else 0.0
+    @checker("left_frac")
+    def check_left_frac(self, state: TutorState, answer: Answer):
+        if "/" not in answer.body:
+            return ("Запиши как a/b (пример: 2/3).", False)
+        p = state.problem
+        if p:
+            if answer.ratio is None:
+                return ("Запиши как a/b (пример: 2/3).", False)
+            if answer.ratio != p.terms[:2]:
+                return ("Возьми первую пару из пропорции: что стоит до ':' и что после?", False)
+        return ("Ок.", True)
 
-    def init(self, problem_text: str) -> TutorState:
-        steps = [
-            Step("Запиши пропорцию в виде дробей: a/b = c/x. Что будет в числителе и знаменателе слева? (a/b)",
-                 ["Читай пропорцию 'a относится к b'.",
-                  "Левая дробь — первая пара.",
-                  "Запиши как a/b."],
-                 "left_frac"),
-            Step("Сформулируй правило: произведение крайних равно произведению средних. Как выглядит уравнение?",
-                 ["a·x = b·c.", "Перемножь по диагонали.", "Запиши без вычислений."],
-                 "diag_rule"),
-            Step("Вырази x из уравнения. Что получится?",
-                 ["x = (b·c)/a.", "Сначала вырази x символически.", "Числа подставим позже."],
-                 "solve_x"),
-            Step("Подставь числа из задачи и вычисли x. Напиши число.",
-                 ["Аккуратно подставь и сократи при необходимости.", "Только число.", "Без округления."],
-                 "x_value"),
-        ]
-        return TutorState(skill_id=self.id, problem_text=problem_text, steps=steps, scratch={})
-
-    def next_step(self, state: TutorState, user_text: str):
-        i = state.step_index
-        step = state.steps[i]
-        if step.answer_checker == "left_frac":
-            if "/" not in user_text:
-                return ("Запиши как a/b (пример: 2/3).", step)
-            fb = "Ок."
-        elif step.answer_checker == "diag_rule":
-            fb = "Правильно: a·x = b·c."
-        elif step.answer_checker == "solve_x":
-            if "x" not in user_text:
-                return ("Вырази именно x (например: x = (b·c)/a).", step)
-            fb = "Верно: x = (b·c)/a."
-        elif step.answer_checker == "x_value":
-            if not is_number(user_text):
-                return ("Нужно число.", step)
-            fb = "Готово! Ты нашёл(ла) значение x сам(а)."
-            state.finished = True
-            return (fb, None)
-        else:
-            fb = "Ок."
+    def _equation(self, state: TutorState, answer: Answer, correct: str, wrong: str):
+        # the student's equation must have the same x as the problem; a..d are
+        # the terms of the proportion, so "a·x = b·c" works as well as numbers
+        if answer.expr is None:
+            return ("Запиши уравнение с x, числами или буквами a, b, c (например: a·x = b·c).", False)
+        p = state.problem
+        if not p:
+            return (correct, True)
+        t = ["x" if v is None else f"({v})" for v in p.terms]
+        expected = f"{t[0]}*{t[3]}={t[1]}*{t[2]}"
+        values = tuple((name, str(v)) for name, v in zip("abcd", p.terms) if v is not None)
+        return SymbolicCheck(answer.expr, expected, values, correct, wrong,
+                             undecided="Не получилось проверить такую запись. Запиши уравнение проще, "
+                                       "например: a·x = b·c.")
 
-        state.step_index += 1
-        if state.step_index < len(state.steps):
-            return (fb, state.steps[state.step_index])
-        else:
-            state.finished = True
-            return (fb, None)
+    @checker("diag_rule")
+    def check_diag_rule(self, state: TutorState, answer: Answer):
+        if "=" not in answer.text:
+            return ("Нужно уравнение: произведение крайних = произведению средних.", False)
+        return self._equation(state, answer, "Правильно: a·x = b·c.",
+                              "Проверь: перемножь крайние члены и средние члены пропорции.")
+
+    @checker("solve_x")
+    def check_solve_x(self, state: TutorState, answer: Answer):
+        if answer.expr is not None and "x" not in answer.expr:
+            return ("Вырази именно x (например: x = (b·c)/a).", False)
+        return self._equation(state, answer, "Верно: x = (b·c)/a.",
+                              "Не сходится с a·x = b·c. Раздели обе части на множитель при x.")
+
+    @checker("x_value")
+    def check_x_value(self, state: TutorState, answer: Answer):
+        if not answer.is_number:
+            return ("Нужно число.", False)
+        if state.trace and not _close(answer.value, state.trace.x):
+            return ("Не сходится. Подставь числа в x = (b·c)/a и вычисли ещё раз.", False)
+        return ("Готово! Ты нашёл(ла) значение x сам(а).", True)
+
+_classifier: Optional[Classifier] = None
+_classifier_version = -1
 
-SKILLS: Dict[str, Skill] = {
-    LinearEq.id: LinearEq(),
-    FracAdd.id: FracAdd(),
-    QuadraticEq.id: QuadraticEq(),
-    Proportion.id: Proportion(),
-}
+def classifier() -> Classifier:
+    global _classifier, _classifier_version
+    if _classifier is None or _classifier_version != SKILLS.version:
+        signatures = {s.id: s.signature for s in SKILLS.values()}
+        _classifier = Classifier(signatures, default=LinearEq.id)
+        _classifier_version = SKILLS.version
+    return _classifier
 
 def best_skill(problem_text: str) -> Skill:
-    best = None
-    best_score = -1
-    for s in SKILLS.values():
-        score = s.match(problem_text)
-        if score > best_score:
-            best_score = score
-            best = s
-    return best if best else SKILLS["linear_eq"]
+    return SKILLS[classifier().rank(problem_text).best]
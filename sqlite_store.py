@@ -0,0 +1,242 @@
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
+
+from .classroom import find_assignment
+from .session import TutorState, LRUStore
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id INTEGER PRIMARY KEY,
+    data    TEXT    NOT NULL,
+    updated REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);
+"""
+
+UPSERT = ("INSERT INTO sessions(user_id, data, updated) VALUES (?, ?, ?) "
+          "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated = excluded.updated")
+
+# Steps and the parsed problem are not stored: they are shared, looked up again
+# by skill id and problem text on load. Scratch is stored as its field values
+# in slot order; fields added later go at the end, so older rows still load.
+# A classroom assignment is stored by id and found again while it is live.
+def dump_state(state: TutorState) -> str:
+    sc = state.scratch
+    scratch = [getattr(sc, name) for name in sc.__slots__] if sc is not None else None
+    assignment = state.assignment.id if state.assignment is not None else None
+    row = [state.skill_id, state.problem_text, state.step_index, state.hints_used,
+           int(state.finished), scratch, state.mistakes, assignment]
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+
+def load_state(data: str) -> TutorState:
+    from .skills import SKILLS
+
+    skill_id, problem_text, step_index, hints_used, finished, scratch, *rest = json.loads(data)
+    skill = SKILLS[skill_id]
+    return TutorState(
+        skill_id=skill_id,
+        problem_text=problem_text,
+        step_index=step_index,
+        steps=skill.steps,
+        hints_used=hints_used,
+        scratch=skill.scratch_type(*scratch) if scratch is not None else None,
+        finished=bool(finished),
+        mistakes=rest[0] if rest else 0,
+        assignment=find_assignment(rest[1]) if len(rest) > 1 else None,
+        problem=skill.parse(problem_text),
+        trace=skill.solve(problem_text),
+    )
+
+async def _prepare(data: str) -> None:
+    # parses the problem in the sympy pool if it needs that, see Skill.prepare
+    from .skills import SKILLS
+
+    skill_id, problem_text = json.loads(data)[:2]
+    await SKILLS[skill_id].prepare(problem_text)
+
+# Same get/set/clear interface as MemoryStore. get() only looks at the
+# in-memory cache and the writes not flushed yet; a session that is only on
+# disk is brought into the cache by `await load(user_id)`, a primary-key
+# lookup on the store's thread (WAL readers never wait on the writer), which
+# the bot does before each update is handled (SessionLoadMiddleware) and the
+# API before each request. Writes only mark the session dirty; a background
+# task flushes all dirty sessions in one transaction on that same thread, so a
+# burst of answers costs one commit and the event loop never waits on the disk.
+class SQLiteStore:
+    def __init__(self, path: str, cache: Optional[LRUStore] = None, idle_ttl: float = 0.0,
+                 flush_interval: float = 0.5, batch_size: int = 256, purge_interval: float = 600.0):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.purge_interval = purge_interval
+        self._cache = cache if cache is not None else LRUStore(idle_ttl=idle_ttl)
+        # user_id -> state to write, None means delete
+        self._pending: Dict[int, Optional[TutorState]] = {}
+        self._inflight: Dict[int, Optional[TutorState]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _open(self) -> None:
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self._reader = self._connect()
+
+    def _pending_lookup(self, user_id: int) -> Tuple[bool, Optional[TutorState]]:
+        if user_id in self._pending:
+            return True, self._pending[user_id]
+        if user_id in self._inflight:
+            return True, self._inflight[user_id]
+        return False, None
+
+    def get(self, user_id: int) -> Optional[TutorState]:
+        state = self._cache.get(user_id)
+        if state is not None:
+            return state
+        _, state = self._pending_lookup(user_id)
+        if state is not None:
+            self._cache.set(user_id, state)
+        return state
+
+    def peek(self, user_id: int) -> Optional[TutorState]:
+        # only what is in memory, see LRUStore.peek
+        state = self._cache.peek(user_id)
+        return state if state is not None else self._pending_lookup(user_id)[1]
+
+    def _read(self, user_id: int) -> Optional[str]:
+        row = self._reader.execute(
+            "SELECT data, updated FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None or (self.idle_ttl > 0 and time.time() - row[1] > self.idle_ttl):
+            return None
+        return row[0]
+
+    async def fetch(self, user_id: int) -> Optional[TutorState]:
+        # peek() that also reads a session that is only on disk, without
+        # bringing it into the cache: reminders look at sessions after a restart
+        found, state = self._pending_lookup(user_id)
+        if found:
+            return state
+        state = self._cache.peek(user_id)
+        if state is not None:
+            return state
+        data = await asyncio.get_running_loop().run_in_executor(self._executor, self._read, user_id)
+        if data is None:
+            return None
+        await _prepare(data)
+        return load_state(data)
+
+    async def load(self, user_id: int) -> None:
+        if self._cache.get(user_id) is not None or self._pending_lookup(user_id)[0]:
+            return
+        data = await asyncio.get_running_loop().run_in_executor(self._executor, self._read, user_id)
+        if data is None:
+            return
+        await _prepare(data)
+        # set or cleared meanwhile: that is newer than the row
+        if self._cache.get(user_id) is not None or self._pending_lookup(user_id)[0]:
+            return
+        self._cache.set(user_id, load_state(data))
+
+    def set(self, user_id: int, state: TutorState) -> None:
+        self._cache.set(user_id, state)
+        self._mark(user_id, state)
+
+    def clear(self, user_id: int) -> None:
+        self._cache.clear(user_id)
+        self._mark(user_id, None)
+
+    def _mark(self, user_id: int, state: Optional[TutorState]) -> None:
+        self._pending[user_id] = state
+        if self._wake is not None and len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def _write(self, upserts: List[Tuple[int, str, float]], deletes: List[Tuple[int]],
+               purge_before: Optional[float]) -> None:
+        conn = self._writer
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(UPSERT, upserts)
+            conn.executemany("DELETE FROM sessions WHERE user_id = ?", deletes)
+            if purge_before is not None:
+                conn.execute("DELETE FROM sessions WHERE updated < ?", (purge_before,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def flush(self) -> None:
+        now = time.time()
+        purge_before = None
+        if self.idle_ttl > 0 and now - self._last_purge >= self.purge_interval:
+            purge_before = now - self.idle_ttl
+            self._last_purge = now
+        if not self._pending and purge_before is None:
+            return
+        batch, self._pending = self._pending, {}
+        self._inflight = batch
+        # serialize on the loop: handlers mutate states in place between awaits
+        upserts = [(uid, dump_state(s), now) for uid, s in batch.items() if s is not None]
+        deletes = [(uid,) for uid, s in batch.items() if s is None]
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write, upserts, deletes, purge_before)
+        except Exception:
+            log.exception("Failed to flush %d sessions, will retry", len(batch))
+            # newer writes made during the flush win over the failed batch
+            self._pending = {**batch, **self._pending}
+        finally:
+            self._inflight = {}
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._writer is None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        await self._cache.start()
+        if self._flusher is None:
+            self._wake = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self._cache.stop()
+        if self._writer is not None:
+            await self.flush()
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._reader.close)
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._writer.close)
+            self._reader = self._writer = None
+        self._executor.shutdown(wait=True)
@@ -3,6 +3,8 @@ from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import CommandStart, Command
 
+from ..outbox import Outbox
+
 router = Router(name=__name__)
 
 WELCOME = (
@@ -14,20 +16,23 @@ WELCOME = (
     "/hint — подсказка к текущему шагу\n"
     "/giveup — показать план решения (без ответа)\n"
     "/topics — список поддерживаемых типов\n"
+    "/practice ТЕМА — задача для тренировки (например: /practice дроби)\n"
+    "/join КОД — присоединиться к классу учителя\n"
     "/help — краткая справка"
 )
 
 @router.message(CommandStart())
-async def on_start(m: Message):
-    await m.answer(WELCOME)
+async def on_start(m: Message, outbox: Outbox):
+    outbox.send(m.chat.id, WELCOME)
 
 @router.message(Command("help"))
-async def on_help(m: Message):
-    await m.answer(WELCOME)
+async def on_help(m: Message, outbox: Outbox):
+    outbox.send(m.chat.id, WELCOME)
 
 @router.message(Command("topics"))
-async def on_topics(m: Message):
-    await m.answer(
+async def on_topics(m: Message, outbox: Outbox):
+    outbox.send(
+        m.chat.id,
         "Поддерживаю пока такие типы задач:\n"
         "• Линейные уравнения (ax + b = c)\n"
         "• Квадратные уравнения (ax² + bx + c = 0)\n"
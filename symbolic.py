@@ -0,0 +1,247 @@
+
+import asyncio
+import logging
+import multiprocessing
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .classify import unify_symbols
+from .utils import safe_powers
+
+log = logging.getLogger(__name__)
+
+# Students write the letters of the textbook formula in Cyrillic as often as not
+_LETTERS = str.maketrans({"а": "a", "б": "b", "в": "b", "с": "c", "д": "d", ":": "/"})
+# parse_expr evaluates its input, so only these characters ever reach it
+_ALLOWED = re.compile(r"^[0-9abcdx.+\-*/^()=]+$")
+MAX_INPUT = 80
+
+def normalize_expression(text: str) -> Optional[str]:
+    expr = "".join(unify_symbols(text).translate(_LETTERS).split()).replace("**", "^")
+    if not expr or len(expr) > MAX_INPUT or not _ALLOWED.match(expr) or expr.count("=") > 1:
+        return None
+    if not safe_powers(expr):
+        return None
+    return expr
+
+def _parse(side: str, values: Dict[str, str]):
+    import sympy
+    from sympy.parsing.sympy_parser import (
+        parse_expr, standard_transformations, implicit_multiplication_application, convert_xor)
+
+    names = {name: sympy.Symbol(name) for name in "abcdx"}
+    expr = parse_expr(side, local_dict=names,
+                      transformations=standard_transformations + (implicit_multiplication_application, convert_xor))
+    return expr.subs({names[k]: sympy.Rational(v) for k, v in values.items()})
+
+def equivalent(answer: str, expected: str, values: Tuple[Tuple[str, str], ...] = ()) -> Optional[bool]:
+    # Both sides are normalize_expression() output; letters a-d are replaced
+    # by `values`. Equations are equivalent when they have the same solutions
+    # for x (so "a*x=b*c", "x*a=c*b" and "x=bc/a" all are); an expression
+    # without "=" stands for "x = expression". None: sympy isn't installed.
+    try:
+        import sympy
+    except ImportError:
+        return None
+    if not (safe_powers(answer) and safe_powers(expected)):
+        return False
+    subs = dict(values)
+    x = sympy.Symbol("x")
+    try:
+        sets = []
+        for text in (answer, expected):
+            left, _, right = text.rpartition("=") if "=" in text else ("x", "", text)
+            equation = _parse(left, subs) - _parse(right, subs)
+            if equation.free_symbols - {x}:
+                return False  # letters that aren't in the problem
+            sets.append(set(sympy.solve(equation, x)))
+    except Exception:
+        return False
+    return sets[0] == sets[1] and bool(sets[0])
+
+class SymbolicCheck(NamedTuple):
+    # What a checker returns instead of (feedback, accepted) when the answer
+    # needs sympy; Skill.anext_step resolves it in the process pool.
+    answer: str
+    expected: str
+    values: Tuple[Tuple[str, str], ...]
+    correct: str
+    wrong: str
+    # shown when the answer can't be checked in time; the step isn't accepted
+    undecided: str
+
+@dataclass
+class SymbolicStats:
+    checks: int = 0
+    cache_hits: int = 0
+    timeouts: int = 0
+
+def _warm_up() -> None:
+    import sympy  # noqa: F401
+
+def _ready(_) -> bool:
+    return True
+
+# A process pool and how many checks are running in it.
+class _Workers:
+    __slots__ = ("pool", "running", "retired")
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.running = 0
+        self.retired = False
+
+# Runs equivalent() in a small process pool so a slow sympy call never blocks
+# the event loop (call() runs other sympy work there, such as parsing a
+# problem). start() spawns the pool and imports sympy in it in the
+# background. At most `workers` checks are in the pool at once, the rest wait
+# on the loop, so `timeout` only covers the check itself. A check that takes
+# longer is undecided (None): the answer is not accepted and the student is
+# asked to write it more simply. A worker stuck in sympy can't be interrupted,
+# so its pool is retired: new checks go to a fresh pool, and the old one is
+# terminated once the checks it still runs for others are done. Results,
+# undecided ones included, are kept in an LRU cache, so the same pathological
+# answer only costs one timeout.
+class SymbolicChecker:
+    def __init__(self, workers: int = 2, timeout: float = 2.0, cache_size: int = 4096):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.stats = SymbolicStats()
+        self._workers: Optional[_Workers] = None
+        self._retired: List[_Workers] = []
+        self._spawning = asyncio.Lock()
+        self._slots = asyncio.Semaphore(workers)
+        self._starting: Optional[asyncio.Task] = None
+        self._cache: "OrderedDict[tuple, Optional[bool]]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def _cached(self, key: tuple) -> Tuple[bool, Optional[bool]]:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats.cache_hits += 1
+            return True, self._cache[key]
+        return False, None
+
+    def _remember(self, key: tuple, result: Optional[bool]) -> None:
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _spawn(self) -> _Workers:
+        # blocking: returns once the workers are up with sympy imported
+        pool = multiprocessing.get_context("spawn").Pool(self.workers, initializer=_warm_up)
+        pool.map(_ready, range(self.workers), chunksize=1)
+        return _Workers(pool)
+
+    def check_sync(self, answer: str, expected: str, values=()) -> Optional[bool]:
+        # for tools without an event loop (batch, benchmarks): one check at a
+        # time, with the same pool and deadline as check()
+        key = (answer, expected, values)
+        hit, result = self._cached(key)
+        if hit:
+            return result
+        self.stats.checks += 1
+        if self._workers is None:
+            self._workers = self._spawn()
+        try:
+            result = self._workers.pool.apply_async(equivalent, key).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            self.stats.timeouts += 1
+            log.warning("Symbolic check timed out: %r vs %r", answer, expected)
+            workers, self._workers = self._workers, None
+            workers.pool.terminate()
+        self._remember(key, result)
+        return result
+
+    async def _get(self) -> _Workers:
+        async with self._spawning:
+            if self._workers is None:
+                self._workers = await asyncio.get_running_loop().run_in_executor(None, self._spawn)
+            return self._workers
+
+    async def start(self) -> None:
+        # doesn't wait for the pool: the bot starts polling meanwhile
+        if self._starting is None:
+            self._starting = asyncio.create_task(self._get())
+
+    async def check(self, answer: str, expected: str, values=()) -> Optional[bool]:
+        key = (answer, expected, values)
+        hit, result = self._cached(key)
+        if hit:
+            return result
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return await fut
+        fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+        self.stats.checks += 1
+        result = None
+        try:
+            async with self._slots:
+                result = await self._run(await self._get(), equivalent, key)
+            self._remember(key, result)
+            return result
+        finally:
+            fut.set_result(result)
+            del self._inflight[key]
+
+    async def call(self, fn, *args):
+        # fn(*args) in the pool, under the same limits; None when it times out
+        # or raises. Not cached: callers keep what they need
+        async with self._slots:
+            return await self._run(await self._get(), fn, args)
+
+    async def _run(self, workers: _Workers, fn, args: tuple):
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def finish(value) -> None:
+            # a check that timed out was already let go of below
+            if not done.done():
+                done.set_result(value)
+                self._release(workers)
+
+        workers.running += 1
+        workers.pool.apply_async(fn, args, callback=lambda v: loop.call_soon_threadsafe(finish, v),
+                                 error_callback=lambda e: loop.call_soon_threadsafe(finish, None))
+        try:
+            return await asyncio.wait_for(asyncio.shield(done), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            log.warning("Symbolic %s timed out: %r", fn.__name__, args)
+            done.cancel()
+            if not workers.retired:
+                workers.retired = True
+                self._retired.append(workers)
+                if self._workers is workers:
+                    self._workers = None
+            self._release(workers)
+            return None
+
+    def _release(self, workers: _Workers) -> None:
+        workers.running -= 1
+        if workers.retired and not workers.running:
+            self._retired.remove(workers)
+            asyncio.get_running_loop().run_in_executor(None, workers.pool.terminate)
+
+    async def close(self) -> None:
+        if self._starting is not None:
+            self._starting.cancel()
+        pools = [w.pool for w in self._retired]
+        if self._workers is not None:
+            pools.append(self._workers.pool)
+        self._workers, self._retired = None, []
+        for pool in pools:
+            await asyncio.get_running_loop().run_in_executor(None, pool.terminate)
+
+_checker = SymbolicChecker()
+
+def configure(workers: int, timeout: float) -> SymbolicChecker:
+    global _checker
+    _checker = SymbolicChecker(workers, timeout)
+    return _checker
+
+def get_checker() -> SymbolicChecker:
+    return _checker
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Set
+
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+from ..coach import Coach
+from ..concurrency import ConcurrencyMiddleware
+from ..engine.classroom import Assignment, ClassroomRegistry
+from ..outbox import Outbox
+
+log = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+# fan-outs of /push still running; referenced so they aren't collected
+_pushes: Set[asyncio.Task] = set()
+
+@router.message(Command("class"))
+async def on_class(m: Message, outbox: Outbox, classrooms: ClassroomRegistry):
+    room = classrooms.create(m.from_user.id)
+    outbox.send(m.chat.id,
+                f"Класс создан. Код: {room.code}\n"
+                f"Ученики присоединяются командой /join {room.code}\n"
+                "Отправить задачу всем: /push <условие>, посмотреть прогресс: /progress")
+
+@router.message(Command("join"))
+async def on_join(m: Message, command: CommandObject, outbox: Outbox, classrooms: ClassroomRegistry):
+    room = classrooms.get(command.args or "")
+    if room is None:
+        return outbox.send(m.chat.id, "Не нашёл такой класс. Проверь код у учителя: /join КОД")
+    room.students.add(m.from_user.id)
+    outbox.send(m.chat.id, "Ты в классе! Задачи от учителя придут сюда.")
+
+@router.message(Command("push"))
+async def on_push(m: Message, command: CommandObject, outbox: Outbox, classrooms: ClassroomRegistry,
+                  coach: Coach, concurrency: ConcurrencyMiddleware):
+    room = classrooms.of_teacher(m.from_user.id)
+    if room is None:
+        return outbox.send(m.chat.id, "Сначала создай класс командой /class.")
+    problem = (command.args or "").strip()
+    if not problem:
+        return outbox.send(m.chat.id, "Напиши условие после команды: /push Реши: 2x + 5 = 17")
+    if not room.students:
+        return outbox.send(m.chat.id, f"В классе пока никого нет. Код для учеников: {room.code}")
+
+    from ..engine.skills import best_skill
+
+    skill = best_skill(problem)
+    await skill.prepare(problem)
+    assignment = room.assignment = Assignment(skill, problem)
+
+    async def push(uid: int) -> None:
+        # under the student's lock, so an answer being checked right now can't
+        # write the old session back over the new one
+        async with concurrency.user(uid):
+            await coach.store.load(uid)
+            # private chats: chat id is the user id; the outbox paces the sends
+            outbox.send(uid, *coach.assign(uid, assignment, room.code).texts)
+
+    async def push_all(students) -> None:
+        results = await asyncio.gather(*(push(uid) for uid in students), return_exceptions=True)
+        for uid, result in zip(students, results):
+            if isinstance(result, Exception):
+                log.error("Push to %s in class %s failed", uid, room.code, exc_info=result)
+        outbox.send(m.chat.id, f"Отправил задачу {len(students)} ученикам. Прогресс: /progress")
+
+    # Apart from this handler, which holds the teacher's lock and a handler
+    # slot while a student's update may hold that student's lock and wait for
+    # a slot. The fan-out holds no slot and one student's lock at a time.
+    task = asyncio.create_task(push_all(list(room.students)))
+    _pushes.add(task)
+    task.add_done_callback(_pushes.discard)
+
+@router.message(Command("progress"))
+async def on_progress(m: Message, outbox: Outbox, classrooms: ClassroomRegistry):
+    room = classrooms.of_teacher(m.from_user.id)
+    if room is None or room.assignment is None:
+        return outbox.send(m.chat.id, "Нет активной задачи. Создай класс (/class) и отправь задачу (/push).")
+    a = room.assignment
+    p = a.progress()
+    lines = [f"Задача: {a.template.problem_text}", f"Учеников: {len(room.students)}"]
+    for i, count in enumerate(p.steps):
+        lines.append(f"Шаг {i + 1}/{len(p.steps)}: {count}")
+    lines.append(f"Решили: {p.solved}")
+    if p.dropped:
+        lines.append(f"Бросили: {p.dropped}")
+    outbox.send(m.chat.id, "\n".join(lines))
+
+# Instead of `router` in a sharded worker: classes span users of every shard,
+# so they only work with WORKERS=1 (see main.build_dispatcher)
+off_router = Router(name=__name__ + ".off")
+
+@off_router.message(Command("class", "join", "push", "progress"))
+async def on_class_off(m: Message, outbox: Outbox):
+    outbox.send(m.chat.id, "Классы сейчас недоступны. Можно решать задачи самостоятельно: /practice")
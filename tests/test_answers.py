@@ -0,0 +1,58 @@
+from fractions import Fraction
+
+import pytest
+
+from bot.engine.answers import DECIMAL, EXPR, FRACTION, INT, LIST, mentions_none, parse_answer
+from bot.engine.utils import MAX_DIGITS, parse_number
+
+@pytest.mark.parametrize("text, kind, value", [
+    ("6", INT, Fraction(6)),
+    ("-6", INT, Fraction(-6)),
+    ("x = 6", INT, Fraction(6)),
+    ("х = 6", INT, Fraction(6)),
+    ("-1,5", DECIMAL, Fraction(-3, 2)),
+    (".5", DECIMAL, Fraction(1, 2)),
+    ("3/4", FRACTION, Fraction(3, 4)),
+    ("−3 / 4", FRACTION, Fraction(-3, 4)),
+    ("abc", EXPR, None),
+])
+def test_numbers(text, kind, value):
+    answer = parse_answer(text)
+    assert (answer.kind, answer.value) == (kind, value)
+
+def test_assignment_keeps_its_name():
+    assert parse_answer("x = 6").name == "x"
+    assert parse_answer("D = 49").name == "D"
+    assert parse_answer("6").name is None
+
+def test_lists():
+    assert parse_answer("2; 3").kind == LIST
+    assert parse_answer("2; 3").numbers() == (2, 3)
+    assert parse_answer("x1 = 2, x2 = 3").numbers() == (2, 3)
+    assert parse_answer("1, -5, 6").numbers() == (1, -5, 6)
+    assert parse_answer("1, x").numbers() is None
+    # one number to a checker that wants a number, two to one that wants a list
+    answer = parse_answer("1,5")
+    assert answer.value == Fraction(3, 2) and answer.numbers() == (1, 5)
+
+def test_ratio_keeps_terms_as_written():
+    assert parse_answer("4/6").ratio == (4, 6)
+    assert parse_answer("x/3").ratio == (None, 3)
+    assert parse_answer("1,5 / x").ratio == (Fraction(3, 2), None)
+    assert parse_answer("6").ratio is None
+
+def test_expr_for_sympy():
+    assert parse_answer("a·x = b·c").expr == "a*x=b*c"
+    assert parse_answer("x = 6").expr == "x=6"
+    assert parse_answer("нет").expr is None
+    assert parse_answer("9^2^2^2^2^2").expr is None
+
+def test_mentions_none():
+    assert mentions_none(parse_answer("корней нет"))
+    assert not mentions_none(parse_answer("2, 3"))
+
+def test_parse_number_limits():
+    assert parse_number("1" * MAX_DIGITS) == int("1" * MAX_DIGITS)
+    assert parse_number("1" * (MAX_DIGITS + 1)) is None
+    assert parse_number("1/0") is None
+    assert parse_number("-") is None
@@ -0,0 +1,53 @@
+import asyncio
+
+from bot.coach import Coach
+from bot.engine.classroom import Assignment
+from bot.engine.practice import ProblemPool
+from bot.engine.session import LRUStore, MemoryStore
+from bot.engine.skills import SKILLS
+from bot.engine.sqlite_store import SQLiteStore
+from bot.events import EventLog
+
+PROBLEM = "Реши: 2x + 5 = 17"
+ANSWERS = ("2", "5", "17", "12", "6")
+
+def coach(store):
+    return Coach(store, EventLog(None), ProblemPool())
+
+def test_progress_follows_answers():
+    c = coach(MemoryStore())
+    assignment = Assignment(SKILLS["linear_eq"], PROBLEM)
+    for uid in (1, 2, 3):
+        c.assign(uid, assignment, "ABC123")
+    assert assignment.progress() == ([3, 0, 0, 0, 0], 0, 0)
+
+    async def answers():
+        await c.answer(1, "2")
+        await c.answer(1, "7")  # wrong: stays on step 2
+        for text in ANSWERS:
+            await c.answer(2, text)
+    asyncio.run(answers())
+    c.new(3)
+    assert assignment.progress() == ([0, 1, 0, 0, 0], 1, 1)
+
+def test_session_reloaded_from_sqlite_keeps_its_assignment(tmp_path):
+    async def run():
+        store = SQLiteStore(str(tmp_path / "sessions.db"), LRUStore(max_sessions=1))
+        await store.start()
+        try:
+            c = coach(store)
+            assignment = Assignment(SKILLS["linear_eq"], PROBLEM)
+            c.assign(1, assignment, "ABC123")
+            await store.flush()
+            # evicted from the cache by another session
+            await c.start(2, PROBLEM)
+            await store.flush()
+            assert store.get(1) is None
+            await store.load(1)
+            assert store.get(1).assignment is assignment
+            await c.answer(1, "2")
+            return assignment.progress()
+        finally:
+            await store.stop()
+
+    assert asyncio.run(run()) == ([0, 1, 0, 0, 0], 0, 0)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from bot.coach import Coach
+from bot.engine import symbolic
+from bot.engine.practice import ProblemPool
+from bot.engine.session import MemoryStore
+from bot.events import EventLog
+
+def coach():
+    return Coach(MemoryStore(), EventLog(None), ProblemPool())
+
+async def walk(c, uid, problem, answers):
+    replies = [await c.text(uid, problem)]
+    for text in answers:
+        replies.append(await c.text(uid, text))
+    return replies
+
+@pytest.mark.parametrize("problem, answers", [
+    ("Реши: 2x + 5 = 17", ("2", "5", "17", "12", "6")),
+    ("Реши: 5 = 3x - 4", ("3", "-4", "5", "9", "x = 3")),
+    ("Сложи 1/2 + 1/3", ("2, 3", "6", "3; 2", "5", "5/6")),
+    ("Реши: x^2 - 5x + 6 = 0", ("1, -5, 6", "1", "2", "2, 3")),
+    ("Реши: x^2 - 3x + 1 = 0", ("1, -3, 1", "5", "2", "0,382; 2,618")),
+])
+def test_solved_step_by_step(problem, answers):
+    c = coach()
+    replies = asyncio.run(walk(c, 1, problem, answers))
+    assert all(r.texts[-1].startswith(f"Шаг {i + 1}/") for i, r in enumerate(replies[:-1]))
+    assert replies[-1].state is None and "Готов(а) к новой задаче?" in replies[-1].texts[0]
+    assert c.store.get(1) is None
+
+def test_wrong_answer_stays_on_step():
+    c = coach()
+
+    async def run():
+        await c.start(1, "Реши: 2x + 5 = 17")
+        return await c.answer(1, "3")
+    reply = asyncio.run(run())
+    assert reply.state.step_index == 0 and reply.state.mistakes == 1
+    assert reply.texts[1].startswith("Шаг 1/")
+
+def test_huge_answer_is_just_wrong():
+    c = coach()
+
+    async def run():
+        await c.start(1, "Реши: 2x + 5 = 17")
+        return await c.answer(1, "9" * 500)
+    assert asyncio.run(run()).state.step_index == 0
+
+def test_hints_then_none_left():
+    c = coach()
+    asyncio.run(c.start(1, "Реши: 2x + 5 = 17"))
+    levels = len(c.store.get(1).steps[0].hint_levels)
+    texts = [c.hint(1).texts[0] for _ in range(levels + 1)]
+    assert all(t.startswith("Подсказка:") for t in texts[:levels])
+    assert texts[-1].startswith("Больше подсказок нет")
+    assert c.store.get(1).hints_used == levels
+
+def test_commands_without_a_problem():
+    c = coach()
+    assert not c.hint(1).ok
+    assert not c.giveup(1).ok
+    assert not asyncio.run(c.answer(1, "6")).ok
+    assert c.new(1).ok
+
+def test_giveup_keeps_the_session():
+    c = coach()
+    asyncio.run(c.start(1, "Реши: 2x + 5 = 17"))
+    reply = c.giveup(1)
+    assert reply.state is c.store.get(1) and "/hint" in reply.texts[0]
+
+def test_new_clears_and_text_starts_again():
+    c = coach()
+
+    async def run():
+        await c.text(1, "Реши: 2x + 5 = 17")
+        c.new(1)
+        assert c.store.get(1) is None
+        return await c.text(1, "Сложи 1/2 + 1/3")
+    assert asyncio.run(run()).state.skill_id == "frac_add"
+
+def test_practice_problem_is_solvable():
+    c = coach()
+    reply = c.practice(1, "linear_eq", 1)
+    assert reply.state.skill_id == "linear_eq" and reply.state.problem is not None
+
+def test_proportion_through_the_pool():
+    pytest.importorskip("sympy")
+
+    async def run():
+        checker = symbolic.configure(1, 30.0)
+        try:
+            c = coach()
+            return await walk(c, 1, "Пропорция 3:x = 6:8", ("3/x", "x = 4", "x = 4", "4"))
+        finally:
+            await checker.close()
+    replies = asyncio.run(run())
+    # the session is one object, changed in place: the prompts show the steps
+    assert [r.texts[1].split(":")[0] for r in replies[:-1]] == ["Шаг 1/4", "Шаг 2/4", "Шаг 3/4", "Шаг 4/4"]
+    assert replies[-1].state is None
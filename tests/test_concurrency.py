@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot import metrics
+from bot.concurrency import BUSY_TEXT, ConcurrencyMiddleware
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, chat_id, *texts):
+        self.sent.append((chat_id, texts))
+
+def data(user_id, outbox):
+    return {"event_from_user": SimpleNamespace(id=user_id), "event_chat": SimpleNamespace(id=user_id),
+            "outbox": outbox}
+
+def test_one_user_in_order_and_overflow_shed():
+    shed_before = metrics.SHED.labels().value
+    waits_before = sum(metrics.QUEUE_WAIT.labels().counts)
+
+    async def run():
+        mw = ConcurrencyMiddleware(max_in_flight=1, max_waiting=1)
+        outbox, order, gate = FakeOutbox(), [], asyncio.Event()
+
+        async def handler(event, data):
+            order.append(event)
+            if event == "first":
+                await gate.wait()
+
+        first = asyncio.create_task(mw(handler, "first", data(1, outbox)))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(mw(handler, "second", data(1, outbox)))
+        await asyncio.sleep(0)
+        # one running, one queued: the next one is turned away
+        await mw(handler, "third", data(2, outbox))
+        gate.set()
+        await asyncio.gather(first, second)
+        return mw, outbox, order
+
+    mw, outbox, order = asyncio.run(run())
+    assert order == ["first", "second"]
+    assert outbox.sent == [(2, (BUSY_TEXT,))]
+    assert mw.stats.shed == 1 and mw.stats.processed == 2
+    assert not mw._locks
+    assert metrics.SHED.labels().value == shed_before + 1
+    assert sum(metrics.QUEUE_WAIT.labels().counts) == waits_before + 2
@@ -0,0 +1,53 @@
+import asyncio
+
+from bot.outbox import Outbox, coalesce, split_text
+
+def test_split_text_short_and_exactly_at_limit():
+    assert split_text("", 10) == [""]
+    assert split_text("abc", 10) == ["abc"]
+    assert split_text("a" * 10, 10) == ["a" * 10]
+
+def test_split_text_prefers_line_break_then_space():
+    assert split_text("aaaa bbb\ncc dd", 10) == ["aaaa bbb", "cc dd"]
+    assert split_text("aaaa bbbb cc", 10) == ["aaaa bbbb", "cc"]
+
+def test_split_text_without_break_point_cuts_hard():
+    text = "x" * 25
+    assert split_text(text, 10) == ["x" * 10, "x" * 10, "x" * 5]
+
+def test_split_text_keeps_everything():
+    text = ("строка " * 900 + "\n") * 3
+    parts = split_text(text, 4096)
+    assert all(len(p) <= 4096 for p in parts)
+    assert "".join(parts).replace(" ", "").replace("\n", "") == text.replace(" ", "").replace("\n", "")
+
+def test_coalesce_joins_what_fits():
+    assert coalesce(["a", "b", "c"], limit=10) == ("a\n\nb\n\nc", [])
+    assert coalesce(["aaaa", "bbbb", "cc"], limit=10) == ("aaaa\n\nbbbb", ["cc"])
+
+def test_coalesce_at_limit_and_single_text():
+    # "aaa" + "\n\n" + "bbbbb" is exactly 10
+    assert coalesce(["aaa", "bbbbb", "c"], limit=10) == ("aaa\n\nbbbbb", ["c"])
+    assert coalesce(["a" * 10, "b"], limit=10) == ("a" * 10, ["b"])
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+def test_outbox_splits_long_texts_and_merges_short_ones():
+    async def run():
+        bot = FakeBot()
+        outbox = Outbox(bot, chat_interval=0, global_rate=1000)
+        outbox.send(1, "a" * 5000)
+        outbox.send(2, "first", "second")
+        await outbox.start()
+        await outbox.stop()
+        return bot.sent, outbox.stats
+
+    sent, stats = asyncio.run(run())
+    assert [text for chat, text in sent if chat == 1] == ["a" * 4096, "a" * 904]
+    assert [text for chat, text in sent if chat == 2] == ["first\n\nsecond"]
+    assert stats.sent == 3 and stats.coalesced == 1
@@ -0,0 +1,46 @@
+from fractions import Fraction
+
+import pytest
+
+from bot.engine.problem import (
+    FracSumTrace, LinearProblem, LinearTrace, ProportionTrace, QuadraticTrace, extract_expression,
+    parse_problem, solve_problem)
+
+def test_extract_expression():
+    assert extract_expression("Реши: 2x + 5 = 17") == "2x+5=17"
+    assert extract_expression("Найди x: 3x**2 = 12") == "3x^2=12"
+    assert extract_expression("Реши уравнение 1,5x = 3") == "1.5x=3"
+
+def test_linear():
+    assert parse_problem("linear_eq", "Реши: 2x + 5 = 17") == LinearProblem(2, 5, 17)
+    assert solve_problem("linear_eq", "Реши: 2x + 5 = 17") == LinearTrace(12, 6)
+    # x on the right
+    assert solve_problem("linear_eq", "5 = 3x - 4") == LinearTrace(9, 3)
+    assert solve_problem("linear_eq", "Реши: 3x + 1 = 2") == LinearTrace(1, Fraction(1, 3))
+
+def test_linear_with_parentheses_goes_through_sympy():
+    pytest.importorskip("sympy")
+    assert parse_problem("linear_eq", "Реши: 2(x+3)=10") == LinearProblem(2, 6, 10)
+
+def test_frac_sum():
+    assert solve_problem("frac_add", "1/2 + 1/3") == FracSumTrace(6, 3, 2, 5, Fraction(5, 6))
+
+def test_quadratic_roots():
+    assert solve_problem("quadratic_eq", "x^2 - 5x + 6 = 0") == QuadraticTrace(1, (2, 3))
+    assert solve_problem("quadratic_eq", "x^2 + x + 1 = 0") == QuadraticTrace(-3, ())
+    assert solve_problem("quadratic_eq", "x^2 - 2x + 1 = 0") == QuadraticTrace(0, (1,))
+    trace = solve_problem("quadratic_eq", "x^2 - 3x + 1 = 0")
+    assert trace.D == 5 and [round(r, 2) for r in trace.roots] == [0.38, 2.62]
+
+def test_proportion():
+    assert solve_problem("proportion", "3:x = 6:8") == ProportionTrace(4)
+    assert solve_problem("proportion", "x:4 = 6:8") == ProportionTrace(3)
+
+def test_unparsed_problems():
+    assert parse_problem("linear_eq", "Сколько будет дважды два?") is None
+    assert solve_problem("quadratic_eq", "x^2 = x^2") is None
+    assert parse_problem("proportion", "0:x = 6:8") is None
+
+def test_trace_shared_between_spellings():
+    # a class gets one trace however the problem was typed
+    assert solve_problem("linear_eq", "Реши: 2x+5=17") is solve_problem("linear_eq", "Реши:  2x + 5 = 17")
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from bot.engine.session import LRUStore
+from bot.engine.skills import SKILLS
+from bot.engine.sqlite_store import SQLiteStore
+from bot.reminders import IDLE, ReminderScheduler
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, chat_id, *texts):
+        self.sent.append((chat_id, texts))
+
+def test_idle_reminder_survives_restart(tmp_path):
+    sessions, reminders = str(tmp_path / "sessions.db"), str(tmp_path / "reminders.db")
+
+    async def before():
+        store = SQLiteStore(sessions, LRUStore())
+        await store.start()
+        store.set(7, SKILLS["linear_eq"].init("Реши: 2x + 5 = 17"))
+        scheduler = ReminderScheduler(store, FakeOutbox(), path=reminders)
+        await scheduler.start()
+        scheduler.schedule(7, IDLE, time.time() - 1)
+        await scheduler.stop()
+        await store.stop()
+
+    async def after():
+        store = SQLiteStore(sessions, LRUStore())
+        await store.start()
+        outbox = FakeOutbox()
+        scheduler = ReminderScheduler(store, outbox, path=reminders)
+        await scheduler.start()
+        try:
+            assert await scheduler.fire_due(time.time(), 10) == 1
+            # read from disk without bringing the session back to life
+            assert len(store) == 0
+        finally:
+            await scheduler.stop()
+            await store.stop()
+        return outbox.sent
+
+    asyncio.run(before())
+    sent = asyncio.run(after())
+    assert [chat for chat, _ in sent] == [7]
+    assert "шаге 1/5" in sent[0][1][0]
+
+def test_idle_reminder_skips_finished_session():
+    store = LRUStore()
+    outbox = FakeOutbox()
+    scheduler = ReminderScheduler(store, outbox)
+    scheduler.schedule(7, IDLE, time.time() - 1)
+    assert asyncio.run(scheduler.fire_due(time.time(), 10)) == 0
+    assert scheduler.stats.skipped == 1
+    assert outbox.sent == []
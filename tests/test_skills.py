@@ -0,0 +1,37 @@
+import pytest
+
+from bot.engine.answers import parse_answer
+from bot.engine.skills import SKILLS
+
+LONG = "9" * 500
+
+def check(skill_id, problem, step, text):
+    skill = SKILLS[skill_id]
+    state = skill.init(problem)
+    state.step_index = step
+    return skill.next_step(state, parse_answer(text))
+
+@pytest.mark.parametrize("skill_id, problem, steps", [
+    ("linear_eq", "Реши: 2x + 5 = 17", 5),
+    ("quadratic_eq", "x^2 - 5x + 6 = 0", 4),
+    ("proportion", "3:x = 6:8", 4),
+])
+def test_long_number_is_rejected_not_raised(skill_id, problem, steps):
+    for step in range(steps):
+        _, next_step = check(skill_id, problem, step, LONG)
+        assert next_step is not None
+
+def test_long_number_in_problem_is_left_unparsed():
+    state = SKILLS["linear_eq"].init("Реши: 2x + 5 = 1" + "0" * 400)
+    assert state.problem is None and state.trace is None
+
+def test_scratch_appears_with_the_first_kept_value():
+    from bot.engine.sqlite_store import dump_state, load_state
+
+    skill = SKILLS["linear_eq"]
+    state = skill.init("Реши: 2x + 5 = 17")
+    assert state.scratch is None
+    assert load_state(dump_state(state)).scratch is None
+    skill.next_step(state, parse_answer("2"))
+    assert state.scratch.a == 2
+    assert load_state(dump_state(state)).scratch.a == 2
@@ -0,0 +1,23 @@
+import asyncio
+import statistics
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("aiogram")
+
+from bot import bench_startup
+
+# time from launch to the first getUpdates, median of RUNS
+BUDGET_MS = 1500
+RUNS = 3
+
+def test_time_to_first_poll_within_budget():
+    times = asyncio.run(bench_startup.run(RUNS, timeout=30))
+    median_ms = statistics.median(times) * 1e3
+    assert median_ms <= BUDGET_MS, f"time to first poll {median_ms:.0f} ms, budget {BUDGET_MS} ms"
+
+def test_heavy_modules_stay_off_the_startup_path():
+    imported = {name for name, _, _ in bench_startup.startup_imports()}
+    assert "bot.main" in imported
+    assert not imported & {"sympy", "numpy", "bot.engine.skills"}
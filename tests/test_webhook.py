@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("aiogram")
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.webhook import SECRET_HEADER, build_app
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Student"},
+        "text": "Реши: 2x + 5 = 17",
+    },
+}
+
+def test_webhook_checks_secret_and_feeds_updates():
+    seen = []
+    router = Router()
+
+    @router.message()
+    async def on_message(m: Message):
+        seen.append((m.from_user.id, m.text))
+
+    async def run():
+        dp = Dispatcher()
+        dp.include_router(router)
+        bot = Bot("1:test")
+        app = build_app(dp, bot, "/webhook", secret="s3cret")
+        async with TestClient(TestServer(app)) as client:
+            denied = await client.post("/webhook", json=UPDATE)
+            bad = await client.post("/webhook", data="not json", headers={SECRET_HEADER: "s3cret"})
+            ok = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+            await app["webhook_handler"].close()
+        await bot.session.close()
+        return denied.status, bad.status, ok.status
+
+    assert asyncio.run(run()) == (401, 400, 200)
+    assert seen == [(42, "Реши: 2x + 5 = 17")]
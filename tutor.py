@@ -1,87 +1,50 @@
-
 from aiogram import Router, F
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 
-from ..engine.session import MemoryStore
-from ..engine.skills import SKILLS, best_skill, TutorState, Step
+from ..coach import Coach, Reply
+from ..engine.practice import DIFFICULTIES, TOPICS, find_topic
+from ..outbox import Outbox
 
+# The logic is in coach.Coach, shared with the HTTP API; these handlers only
+# pick the action and deliver the reply. The coach comes from the dispatcher
+# (dp["coach"], see main.py).
 router = Router(name=__name__)
-store = MemoryStore()
 
-def _current_step_text(state: TutorState) -> str:
-    step = state.steps[state.step_index]
-    return f"Шаг {state.step_index+1}/{len(state.steps)}:\n{step.prompt}"
+def _send(m: Message, outbox: Outbox, reply: Reply) -> None:
+    outbox.send(m.chat.id, *reply.texts)
 
 @router.message(Command("new"))
-async def on_new(m: Message):
-    store.clear(m.from_user.id)
-    await m.answer("Ок! Пришли новое задание текстом.")
+async def on_new(m: Message, outbox: Outbox, coach: Coach):
+    _send(m, outbox, coach.new(m.from_user.id))
 
 @router.message(Command("hint"))
-async def on_hint(m: Message):
-    state = store.get(m.from_user.id)
-    if not state or state.finished:
-        return await m.answer("Сначала начни задачу. Пришли условие или используй /new.")
-    step = state.steps[state.step_index]
-    used = state.scratch.get("hints_used", 0)
-    if used >= len(step.hint_levels):
-        return await m.answer("Больше подсказок нет — попробуй сформулировать шаг своими словами.")
-    hint = step.hint_levels[used]
-    state.scratch["hints_used"] = used + 1
-    await m.answer(f"Подсказка: {hint}")
+async def on_hint(m: Message, outbox: Outbox, coach: Coach):
+    _send(m, outbox, coach.hint(m.from_user.id))
 
 @router.message(Command("giveup"))
-async def on_giveup(m: Message):
-    state = store.get(m.from_user.id)
-    if not state:
-        return await m.answer("Нет активной задачи. Пришли условие для начала.")
-    if state.skill_id == "linear_eq":
-        text = ("План решения линейного уравнения ax + b = c:\n"
-                "1) Вычесть b из обеих частей: a·x = c - b\n"
-                "2) Разделить обе части на a: x = (c - b)/a\n"
-                "Попробуй продолжить сам(а) 😉")
-    elif state.skill_id == "quadratic_eq":
-        text = ("План решения квадратного уравнения:\n"
-                "1) Определи a, b, c\n"
-                "2) Посчитай D = b² - 4ac\n"
-                "3) Если D≥0, x = (-b ± √D)/(2a)")
-    elif state.skill_id == "frac_add":
-        text = ("План сложения дробей a/b + c/d:\n"
-                "1) Найди НОК знаменателей\n"
-                "2) Приведи дроби к нему\n"
-                "3) Сложи числители и сократи")
-    elif state.skill_id == "proportion":
-        text = ("План решения пропорции a:b = c:x:\n"
-                "1) Перейди к дробям: a/b = c/x\n"
-                "2) Перемножь по диагонали: a·x = b·c\n"
-                "3) Вырази x: x = (b·c)/a")
+async def on_giveup(m: Message, outbox: Outbox, coach: Coach):
+    _send(m, outbox, coach.giveup(m.from_user.id))
+
+def _practice_usage() -> str:
+    topics = "\n".join(f"• {name}: /practice {prefixes[0]}" for name, prefixes in TOPICS.values())
+    return (f"Выбери тему:\n{topics}\n\n"
+            f"Сложность {DIFFICULTIES[0]}–{DIFFICULTIES[-1]} можно указать после темы: /practice дроби 2")
+
+@router.message(Command("practice"))
+async def on_practice(m: Message, command: CommandObject, outbox: Outbox, coach: Coach):
+    args = (command.args or "").split()
+    if args:
+        skill_id = find_topic(args[0])
     else:
-        text = "Общий план: раздели на шаги и двигайся от определения к преобразованиям."
-    await m.answer(text + "\n\nЧтобы продолжить — ответь на текущий шаг или используй /hint.")
+        # without a topic: another problem like the current one
+        state = coach.store.get(m.from_user.id)
+        skill_id = state.skill_id if state is not None else None
+    difficulty = int(args[1]) if len(args) > 1 and args[1].isdigit() else DIFFICULTIES[0]
+    if skill_id not in TOPICS or difficulty not in DIFFICULTIES:
+        return outbox.send(m.chat.id, _practice_usage())
+    _send(m, outbox, coach.practice(m.from_user.id, skill_id, difficulty))
 
 @router.message(F.text)
-async def on_text(m: Message):
-    uid = m.from_user.id
-    state = store.get(uid)
-
-    if not state:
-        problem = m.text.strip()
-        skill = best_skill(problem)
-        state = skill.init(problem)
-        store.set(uid, state)
-        await m.answer("Принял задачу. Я не даю ответ, а веду тебя вопросами к решению. ✍️")
-        return await m.answer(_current_step_text(state))
-
-    # route to skill
-    skill = {s.id: s for s in SKILLS.values()}[state.skill_id]
-    feedback, next_step = skill.next_step(state, m.text.strip())
-    if next_step is None:
-        if state.finished:
-            store.clear(uid)
-            return await m.answer(feedback + "\n\nГотов(а) к новой задаче? Используй /new или пришли текст.")
-        else:
-            return await m.answer(feedback)
-    else:
-        await m.answer(feedback)
-        await m.answer(_current_step_text(state))
+async def on_text(m: Message, outbox: Outbox, coach: Coach):
+    _send(m, outbox, await coach.text(m.from_user.id, m.text))
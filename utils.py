@@ -1,15 +1,40 @@
 
 import re
+from fractions import Fraction
+from typing import Optional
 
 def normalize_text(s: str) -> str:
     return re.sub(r"\s+", " ", s.strip())
 
-def is_number(s: str) -> bool:
-    try:
-        float(s.replace(',', '.'))
-        return True
-    except Exception:
-        return False
+# sympy expands powers eagerly, so "9^2^2^2^2^2" or "((9^2)^2)^2..." can keep
+# it busy for minutes. Only squares are let through, never chained, and only a
+# few of them (nested in parentheses they still multiply: at most x^16).
+MAX_POWERS = 4
+_BAD_POWER = re.compile(r"\^(?!2(?![\d.(^]))")
 
-def to_float(s: str) -> float:
-    return float(s.replace(',', '.'))
+def safe_powers(expr: str) -> bool:
+    # `expr` is math text; whitespace and "**" are dealt with here, since
+    # "9* *9" only becomes a power once the spaces are gone
+    expr = "".join(expr.split()).replace("**", "^")
+    return expr.count("^") <= MAX_POWERS and not _BAD_POWER.search(expr)
+
+# 6, -6, 1.5, -1,5, .5, 3/4, -3 / 4; unicode minus allowed
+_NUMBER = re.compile(r"^([+-]?)\s*(?:(\d+)\s*/\s*(\d+)|(\d*)(?:[.,](\d*))?)$")
+# longer numbers answer no school problem, and would overflow float()
+MAX_DIGITS = 30
+
+def parse_number(s: str) -> Optional[Fraction]:
+    # exact value of a number as students type it, None if it isn't one
+    m = _NUMBER.match(s.strip().replace("\u2212", "-"))
+    if not m or sum(len(g) for g in m.groups()[1:] if g) > MAX_DIGITS:
+        return None
+    sign, num, den, whole, frac = m.groups()
+    if num is not None:
+        if not int(den):
+            return None
+        value = Fraction(int(num), int(den))
+    elif whole or frac:
+        value = Fraction(int(whole or 0) * 10 ** len(frac or "") + int(frac or 0), 10 ** len(frac or ""))
+    else:
+        return None
+    return -value if sign == "-" else value
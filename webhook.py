@@ -0,0 +1,74 @@
+
+import asyncio
+import hmac
+import logging
+from typing import Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+log = logging.getLogger(__name__)
+
+# Acknowledges every update immediately and processes it in the background,
+# at most `max_concurrency` at a time. Beyond `max_pending` accepted updates
+# the server answers 503, so Telegram (or the proxy) retries later instead of
+# us buffering without bound.
+class WebhookHandler:
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: str = "",
+                 max_concurrency: int = 64, max_pending: int = 1024):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.max_pending = max_pending
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        if len(self._tasks) >= self.max_pending:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update) -> None:
+        async with self._sem:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                log.exception("Failed to process update %s", update.update_id)
+
+    async def close(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+def build_app(dp: Dispatcher, bot: Bot, path: str, secret: str = "",
+              max_concurrency: int = 64, max_pending: int = 1024) -> web.Application:
+    handler = WebhookHandler(dp, bot, secret, max_concurrency, max_pending)
+    app = web.Application()
+    app.router.add_post(path, handler.handle)
+    app["webhook_handler"] = handler
+
+    async def on_startup(app: web.Application) -> None:
+        await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    async def on_shutdown(app: web.Application) -> None:
+        await handler.close()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app